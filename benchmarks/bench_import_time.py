@@ -0,0 +1,82 @@
+"""
+Copyright 2019 EUROCONTROL
+==========================================
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+   disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided with the distribution.
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products
+   derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE
+USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+==========================================
+
+Editorial note: this license is an instance of the BSD license template as provided by the Open Source Initiative:
+http://opensource.org/licenses/BSD-3-Clause
+
+Details on EUROCONTROL: http://www.eurocontrol.int
+"""
+
+__author__ = "EUROCONTROL (SWIM)"
+
+# Measures the time it takes to import each facade module in a fresh interpreter, on top of the interpreter startup
+# itself, and fails if it exceeds the budget.
+#
+# Usage: python benchmarks/bench_import_time.py [budget in seconds, default 0.1]
+
+import statistics
+import subprocess
+import sys
+import time
+
+MODULES = [
+    'pubsub_facades.swim_pubsub',
+    'pubsub_facades.geofencing_pubsub',
+]
+
+REPEAT = 10
+
+
+def interpreter_time(code: str) -> float:
+    """
+    :param code:
+    :return: the median wall time of running code in a fresh interpreter
+    """
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, '-c', code])
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings)
+
+
+def main():
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else 0.1
+
+    baseline = interpreter_time('pass')
+    print(f"{'interpreter startup':>34}: {baseline * 1e3:7.1f} ms")
+
+    exceeded = False
+    for module_name in MODULES:
+        overhead = interpreter_time(f'import {module_name}') - baseline
+        exceeded |= overhead > budget
+        print(f"{module_name:>34}: {overhead * 1e3:7.1f} ms")
+
+    if exceeded:
+        sys.exit(f"Import time budget of {budget * 1e3:.0f} ms exceeded")
+
+
+if __name__ == '__main__':
+    main()
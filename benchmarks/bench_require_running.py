@@ -0,0 +1,89 @@
+"""
+Copyright 2019 EUROCONTROL
+==========================================
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+   disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided with the distribution.
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products
+   derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE
+USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+==========================================
+
+Editorial note: this license is an instance of the BSD license template as provided by the Open Source Initiative:
+http://opensource.org/licenses/BSD-3-Clause
+
+Details on EUROCONTROL: http://www.eurocontrol.int
+"""
+
+__author__ = "EUROCONTROL (SWIM)"
+
+# Micro-benchmark of the per call overhead of PubSubFacade.require_running, comparing the tracked container state with
+# querying the container on every call (the behaviour when the container lifecycle cannot be tracked).
+#
+# Usage: python benchmarks/bench_require_running.py
+
+import threading
+import timeit
+from unittest.mock import patch
+
+from pubsub_facades.base import PubSubFacade
+
+NUMBER = 1_000_000
+
+
+class LockedContainer:
+    """ Container stand-in whose state, like a threaded container's, is read under a lock """
+
+    def __init__(self, track: bool):
+        self._lock = threading.Lock()
+        self._running = True
+        if track:
+            self.handler = type('Handler', (), {'handlers': []})()
+
+    def is_running(self) -> bool:
+        with self._lock:
+            return self._running
+
+
+class BenchFacade(PubSubFacade):
+
+    def plain(self):
+        pass
+
+    @PubSubFacade.require_running
+    def guarded(self):
+        pass
+
+
+def main():
+    with patch('pubsub_facades.base.sm_client_api_is_authenticated', return_value=True):
+        untracked = BenchFacade(LockedContainer(track=False), None)
+        tracked = BenchFacade(LockedContainer(track=True), None)
+    # as dispatched by the reactor, here from the (alive) main thread
+    tracked.on_container_start()
+
+    results = {
+        'no guard': timeit.timeit(untracked.plain, number=NUMBER),
+        'guard, container queried': timeit.timeit(untracked.guarded, number=NUMBER),
+        'guard, tracked state': timeit.timeit(tracked.guarded, number=NUMBER),
+    }
+
+    for name, total in results.items():
+        print(f"{name:>26}: {total / NUMBER * 1e9:8.1f} ns/call")
+
+
+if __name__ == '__main__':
+    main()
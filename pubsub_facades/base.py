@@ -31,38 +31,67 @@ Details on EUROCONTROL: http://www.eurocontrol.int
 __author__ = "EUROCONTROL (SWIM)"
 
 from functools import wraps
-import logging.config
-from typing import Type
-
-import yaml
-from rest_client.errors import APIError
-from rest_client.typing import RestClient
-from swim_proton.containers import PubSubContainer
+import importlib
+import logging
+import threading
+import weakref
+from collections.abc import Callable
+from typing import Type, TYPE_CHECKING, Union, Iterable, Optional, Dict
 
 from pubsub_facades import ConfigDict
+from pubsub_facades.config import FacadeConfig, load_config, parse_config_file, thaw
+from pubsub_facades.dedup import DeduplicatingConsumer, DeduplicationStats, message_key
+from pubsub_facades.flow_control import CreditController, CreditFlowHandler, CreditStats
+from pubsub_facades.message_view import MessageViewConsumer, MessageViewDeliveryHandler
 
+if TYPE_CHECKING:
+    from rest_client.typing import RestClient
+    from swim_proton.containers import PubSubContainer
 
-def yaml_file_to_dict(filename: str) -> ConfigDict:
+
+_logger = logging.getLogger(__name__)
+
+
+class lazy_class:
     """
-    Converts a yml file into a dict
-    :param filename:
-    :return:
+    Descriptor that resolves a class from its dotted path upon first access. It is used for the `container_class` and
+    `sm_api_client_class` attributes of the facades so that only the container and client modules of the facade in use
+    are imported.
     """
-    if not filename.endswith(".yml"):
-        raise ValueError("YAML config files should end with '.yml' extension (RTFMG).")
 
-    with open(filename) as f:
-        obj = yaml.load(f, Loader=yaml.FullLoader)
+    def __init__(self, path: str):
+        """
+
+        :param path: dotted path of the class, i.e. 'swim_proton.containers.ConsumerContainer'
+        """
+        self.path = path
+        self._cls = None
+
+    def __get__(self, instance, owner) -> Type:
+        if self._cls is None:
+            module_name, _, class_name = self.path.rpartition('.')
+            self._cls = getattr(importlib.import_module(module_name), class_name)
 
-    return obj or None
+        return self._cls
 
 
-def sm_client_api_is_authenticated(sm_api_client: RestClient) -> bool:
+def yaml_file_to_dict(filename: str) -> ConfigDict:
+    """
+    Converts a YAML (or JSON) config file into a dict
+    :param filename:
+    :return: a mutable copy of the parsed file (see pubsub_facades.config.parse_config_file)
+    """
+    return thaw(parse_config_file(filename)) or None
+
+
+def sm_client_api_is_authenticated(sm_api_client: 'RestClient') -> bool:
     """
     Indicates whether the API client is authenticated. The client should provide a ping_credentials method.
     :param sm_api_client:
     :return:
     """
+    from rest_client.errors import APIError
+
     try:
         sm_api_client.ping_credentials()
     except APIError as e:
@@ -72,7 +101,7 @@ def sm_client_api_is_authenticated(sm_api_client: RestClient) -> bool:
     return True
 
 
-def create_sm_api_client_from_config(config: ConfigDict, sm_api_client_class: Type[RestClient]) -> RestClient:
+def create_sm_api_client_from_config(config: ConfigDict, sm_api_client_class: Type['RestClient']) -> 'RestClient':
     """
     Factory method that creates an instance of an API client. The client should provide
     :param config:
@@ -89,15 +118,49 @@ def create_sm_api_client_from_config(config: ConfigDict, sm_api_client_class: Ty
     )
 
 
+class _ThreadSentinel:
+    """ Object kept in a thread local storage in order to be notified (via weakref.finalize) when the thread ends """
+
+
+def _on_container_thread_end(facade_ref: 'weakref.ref', generation: int) -> None:
+    """
+    Marks the container of the facade as stopped, unless the facade is gone or the container has been restarted since
+    the thread that has just ended started it.
+
+    :param facade_ref: a weak reference to the facade, so that the finalizer does not keep it alive
+    :param generation: the value of the facade's start counter when the thread started the container
+    """
+    facade = facade_ref()
+
+    if facade is not None and facade._container_generation == generation:
+        facade.on_container_stop()
+
+
+class ContainerLifecycleHandler:
+    """
+    Child proton handler that is attached to the messaging handler of a container and forwards the reactor start/stop
+    events to the facade, so that the latter can keep track of the container state without querying it.
+    """
+
+    def __init__(self, facade: 'PubSubFacade'):
+        self.facade = facade
+
+    def on_reactor_init(self, event) -> None:
+        self.facade.on_container_start()
+
+    def on_reactor_final(self, event) -> None:
+        self.facade.on_container_stop()
+
+
 class PubSubFacade:
 
     """ Is used to instantiate the underlying container that interacts with the broker (AMQP1.0 via swim-qpid-proton)"""
-    container_class: Type[PubSubContainer] = None
+    container_class: Type['PubSubContainer'] = None
 
     """ Is used to interact with any subscription management api """
-    sm_api_client_class: Type[RestClient] = None
+    sm_api_client_class: Type['RestClient'] = None
 
-    def __init__(self, container: PubSubContainer, sm_api_client: RestClient):
+    def __init__(self, container: 'PubSubContainer', sm_api_client: 'RestClient'):
         """
 
         :param container:
@@ -106,49 +169,292 @@ class PubSubFacade:
         self.container = container
         self.sm_api_client = sm_api_client
 
+        """ Cached state of the container, None if it cannot be tracked and has to be queried on every check """
+        self._container_running = None
+
+        """ Holds a sentinel in the container thread whose finalization marks the container as stopped """
+        self._container_thread_state = threading.local()
+
+        """ Incremented on every container start, to ignore the end of the threads of previous runs """
+        self._container_generation = 0
+        self._track_container_lifecycle()
+
         if not sm_client_api_is_authenticated(self.sm_api_client):
             raise ValueError("Invalid credentials")
 
+    def _track_container_lifecycle(self) -> None:
+        """
+        Registers a ContainerLifecycleHandler in the messaging handler of the container, if the latter exposes its
+        child handlers.
+        """
+        handlers = getattr(getattr(self.container, 'handler', None), 'handlers', None)
+
+        if not isinstance(handlers, list):
+            return
+
+        handlers.append(ContainerLifecycleHandler(self))
+
+        # if the container has already started its thread cannot be watched, so it is queried until it restarts
+        self._container_running = None if self.container.is_running() else False
+
+    def on_container_start(self) -> None:
+        """
+        Callback to be called from the container thread once the underlying container has started. The state is also
+        reset when that thread ends, so that a container thread dying from an exception without dispatching the stop
+        event is not considered as running. The end of the thread of a previous run is ignored.
+        """
+        self._container_generation += 1
+
+        sentinel = _ThreadSentinel()
+        weakref.finalize(sentinel, _on_container_thread_end, weakref.ref(self), self._container_generation)
+        self._container_thread_state.sentinel = sentinel
+
+        self._container_running = True
+
+    def on_container_stop(self) -> None:
+        """
+        Callback to be called once the underlying container has stopped.
+        """
+        self._container_running = False
+
+    def is_running(self) -> bool:
+        """
+        Indicates whether the underlying container is running. The cached state is used when available.
+        :return:
+        """
+        running = self._container_running
+
+        return self.container.is_running() if running is None else running
+
     def run(self, threaded=False) -> None:
         """
         Runs the underlying container. The threaded mode is intended for the container in order to enable further usage
         of the underlying messaging_handler.
         :param threaded:
         """
-        self.container.run(threaded=threaded)
+        try:
+            self.container.run(threaded=threaded)
+        finally:
+            if not threaded and self._container_running is not None:
+                self.on_container_stop()
 
     @classmethod
     def require_running(cls, f):
         """
         Decorator to be used in methods of classes that derive from PubSubFacade. It prevents them from running in case
-        the underlying container has not started yet.
+        the underlying container has not started yet. When the container lifecycle is tracked the check only reads the
+        cached state, otherwise the container is queried.
         :param f:
         :return:
         """
         @wraps(f)
-        def decorator(*args, **kwargs):
-            self = args[0]
-            if not self.container.is_running():
+        def decorator(self, *args, **kwargs):
+            if self._container_running is not True and not self.is_running():
                 raise RuntimeError("Action cannot complete because container has not been started yet")
-            return f(*args, **kwargs)
+            return f(self, *args, **kwargs)
         return decorator
 
     @classmethod
-    def create_from_config(cls, config_file: str):
+    def create_from_config(cls,
+                           config: Union[str, FacadeConfig],
+                           overlays: Iterable[Union[ConfigDict, str]] = (),
+                           env_prefix: Optional[str] = None):
         """
         Factory method to create the PubSubFacade
-        :param config_file:
+        :param config: either the path of a YAML/JSON config file or an already loaded FacadeConfig which can be shared
+                       between several facades
+        :param overlays: dicts or JSON strings applied on top of the config file (see pubsub_facades.config.load_config)
+        :param env_prefix: if provided, environment variables starting with it are applied on top of the config file
         :return: PubSubFacade
         """
-        config = yaml_file_to_dict(config_file)
+        if not isinstance(config, FacadeConfig):
+            config = load_config(config, overlays=overlays, env_prefix=env_prefix)
 
-        container = cls.container_class.create_from_config(config['BROKER'])
+        container = cls.container_class.create_from_config(thaw(config.broker))
 
-        sm_api_client = create_sm_api_client_from_config(config['SUBSCRIPTION-MANAGER-API'],
+        sm_api_client = create_sm_api_client_from_config(config.subscription_manager_api._asdict(),
                                                          sm_api_client_class=cls.sm_api_client_class)
 
         # configure logging
-        if 'LOGGING' in config:
-            logging.config.dictConfig(config['LOGGING'])
+        if config.logging is not None:
+            import logging.config
+            logging.config.dictConfig(thaw(config.logging))
 
         return cls(container, sm_api_client)
+
+
+class SubscriberFacade(PubSubFacade):
+    """ Base of the facades that consume messages from broker queues """
+
+    """ Opt-in deduplication: a callable returning a new deduplicator (see pubsub_facades.dedup) for each queue """
+    deduplicator_factory: Optional[Callable] = None
+
+    """ Computes the deduplication key of a message, by default its id or a hash of its body """
+    deduplication_key: Callable = staticmethod(message_key)
+
+    """ Opt-in credit autotuning: a callable accepting (message_consumer, get_receiver) and returning a new
+        CreditController (see pubsub_facades.flow_control) for each queue, i.e. functools.partial(CreditController,
+        min_credit=10, max_credit=500). It should be set before the facade is created and its container runs, since
+        the flow control handler of the container is replaced upon creation. """
+    credit_controller_factory: Optional[Callable] = None
+
+    """ Opt-in message views: pubsub_facades.message_view.VIEW to pass MessageView objects to the consumers or
+        pubsub_facades.message_view.PASS_THROUGH to pass them the AMQP encoded message as a memoryview. Like
+        credit_controller_factory, it should be set before the facade is created, so that the messages are read as raw
+        bytes instead of being decoded beforehand. """
+    message_view_mode: Optional[str] = None
+
+    def __init__(self, container: 'PubSubContainer', sm_api_client: 'RestClient'):
+        super().__init__(container, sm_api_client)
+
+        """ The consumers registered in the container by queue """
+        self.message_consumers: Dict[str, Callable] = {}
+
+        self._credit_flow_handler: Optional[CreditFlowHandler] = None
+
+        if self.credit_controller_factory is not None:
+            self._install_credit_flow_handler()
+
+        if self.message_view_mode is not None:
+            self._install_message_view_handler()
+
+    def _attach_message_consumer(self, queue: str, message_consumer: Callable) -> None:
+        """
+        Registers the message consumer on the queue, wrapped in a MessageViewConsumer if a message view mode is set, in
+        a DeduplicatingConsumer if deduplication is enabled and in a CreditController if credit autotuning is enabled.
+
+        :param queue:
+        :param message_consumer:
+        """
+        if self.message_view_mode is not None:
+            message_consumer = MessageViewConsumer(message_consumer, mode=self.message_view_mode)
+
+        if self.deduplicator_factory is not None:
+            message_consumer = DeduplicatingConsumer(message_consumer,
+                                                     deduplicator=self.deduplicator_factory(),
+                                                     key=self.deduplication_key)
+
+        if self.credit_controller_factory is not None:
+            if self._credit_flow_handler is None:
+                _logger.warning(f"The credit of queue {queue} is autotuned without CreditFlowHandler, so its receiver "
+                                f"may still be refilled by the flow controller of the container")
+            message_consumer = self.credit_controller_factory(message_consumer,
+                                                              lambda: self._get_receiver(queue))
+
+        # registered beforehand so that the CreditFlowHandler finds the controller upon the opening of the link
+        self.message_consumers[queue] = message_consumer
+        try:
+            self.container.consumer.attach_message_consumer(queue=queue, message_consumer=message_consumer)
+        except Exception:
+            self.message_consumers.pop(queue, None)
+            raise
+
+    def _detach_message_consumer(self, queue: str) -> None:
+        self.container.consumer.detach_message_consumer(queue=queue)
+        self.message_consumers.pop(queue, None)
+
+    def _install_credit_flow_handler(self) -> None:
+        """
+        Replaces the proton FlowController of the consumer messaging handler with a CreditFlowHandler, so that the
+        credit of the receivers is managed by their CreditController alone.
+        """
+        handlers = self._get_consumer_handlers('CreditFlowHandler')
+        if handlers is None:
+            return
+
+        from proton.handlers import FlowController
+
+        flow_controllers = [handler for handler in handlers if isinstance(handler, FlowController)]
+        window = flow_controllers[0]._window if flow_controllers else 0
+        for flow_controller in flow_controllers:
+            handlers.remove(flow_controller)
+
+        self._credit_flow_handler = CreditFlowHandler(
+            get_credit_controller=lambda queue: self._find_message_consumer(queue, CreditController),
+            window=window
+        )
+        handlers.insert(0, self._credit_flow_handler)
+
+    def _install_message_view_handler(self) -> None:
+        """
+        Replaces the proton IncomingMessageHandler of the consumer messaging handler with a MessageViewDeliveryHandler,
+        so that the messages of the queues whose consumer expects views are not decoded before being consumed.
+        """
+        handlers = self._get_consumer_handlers('MessageViewDeliveryHandler')
+        if handlers is None:
+            return
+
+        from proton.handlers import IncomingMessageHandler
+
+        for i, handler in enumerate(handlers):
+            if isinstance(handler, IncomingMessageHandler):
+                handlers[i] = MessageViewDeliveryHandler(
+                    handler,
+                    is_view_queue=lambda queue: self._find_message_consumer(queue, MessageViewConsumer) is not None
+                )
+
+    def _get_consumer_handlers(self, handler_name: str) -> Optional[list]:
+        """
+        The child handlers of the consumer messaging handler are dispatched from the container thread, so they are only
+        modified before the container runs.
+
+        :param handler_name: the handler to be installed, for logging purposes
+        :return: the child handlers of the consumer messaging handler, or None if they cannot be modified
+        """
+        handlers = getattr(self.container.consumer, 'handlers', None)
+        if not isinstance(handlers, list):
+            return None
+
+        if self.is_running():
+            _logger.warning(f"The container is already running: the {handler_name} cannot be installed")
+            return None
+
+        return handlers
+
+    def _get_receiver(self, queue: str):
+        """
+        Looks up the proton.Receiver that the consumer messaging handler of the container has attached to the queue.
+        :param queue:
+        :return:
+        """
+        for receiver in getattr(self.container.consumer, 'receivers', ()):
+            if receiver.source.address == queue:
+                return receiver
+
+        return None
+
+    def _find_message_consumer(self, queue: str, consumer_class: Type):
+        """
+        Walks down the wrappers of the consumer registered on the queue until one of the given class is found
+        :param queue:
+        :param consumer_class:
+        :return:
+        """
+        message_consumer = self.message_consumers.get(queue)
+
+        while isinstance(message_consumer, (MessageViewConsumer, DeduplicatingConsumer, CreditController)):
+            if isinstance(message_consumer, consumer_class):
+                return message_consumer
+            message_consumer = message_consumer.message_consumer
+
+        return None
+
+    def deduplication_stats(self, queue: str) -> Optional[DeduplicationStats]:
+        """
+        :param queue:
+        :return: the received and dropped duplicate message counters along with the estimated false positive rate of
+                 the queue, or None if its messages are not deduplicated
+        """
+        message_consumer = self._find_message_consumer(queue, DeduplicatingConsumer)
+
+        return message_consumer.stats if message_consumer is not None else None
+
+    def credit_stats(self, queue: str) -> Optional[CreditStats]:
+        """
+        :param queue:
+        :return: the current credit, buffered messages and bytes and the average consume latency of the queue, or None
+                 if credit autotuning is not enabled
+        """
+        message_consumer = self._find_message_consumer(queue, CreditController)
+
+        return message_consumer.stats if message_consumer is not None else None
@@ -0,0 +1,330 @@
+"""
+Copyright 2019 EUROCONTROL
+==========================================
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+   disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided with the distribution.
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products
+   derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE
+USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+==========================================
+
+Editorial note: this license is an instance of the BSD license template as provided by the Open Source Initiative:
+http://opensource.org/licenses/BSD-3-Clause
+
+Details on EUROCONTROL: http://www.eurocontrol.int
+"""
+
+__author__ = "EUROCONTROL (SWIM)"
+
+import json
+import os
+import threading
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Mapping, NamedTuple, Optional, Tuple, Union
+
+from pubsub_facades import ConfigDict
+
+CONFIG_FILE_EXTENSIONS = ('.yml', '.yaml', '.json')
+
+ENV_KEY_SEPARATOR = '__'
+
+SM_API_REQUIRED_KEYS = ('host', 'https', 'timeout', 'verify', 'username', 'password')
+
+""" Keys whose environment values are parsed as JSON even when the config they are applied on does not define them """
+NON_STRING_KEYS = ('https', 'timeout', 'verify')
+
+""" The top level sections of the config, used to match the names of environment variables """
+SECTIONS = ('BROKER', 'SUBSCRIPTION-MANAGER-API', 'LOGGING')
+
+""" Parsed config files keyed by absolute path along with the (mtime, size) stamp they were parsed from """
+_cache: Dict[str, Tuple[Tuple[int, int], ConfigDict]] = {}
+
+""" Validated configs keyed by (path, stamp, overlays, environment variables) they were loaded from """
+_validated_cache: Dict[Tuple, 'FacadeConfig'] = {}
+_cache_lock = threading.Lock()
+
+
+class SubscriptionManagerAPIConfig(NamedTuple):
+    host: str
+    https: bool
+    timeout: Union[int, float]
+    verify: Union[bool, str]
+    username: str
+    password: str
+
+
+class FacadeConfig(NamedTuple):
+    """ Validated, immutable configuration that can be shared between several facades """
+    broker: Mapping[str, Any]
+    subscription_manager_api: SubscriptionManagerAPIConfig
+    logging: Optional[Mapping[str, Any]] = None
+
+
+def get_yaml_loader():
+    """
+    Returns the LibYAML based loader if PyYAML has been built with it, otherwise the pure Python one.
+    :return:
+    """
+    import yaml
+
+    return getattr(yaml, 'CFullLoader', yaml.FullLoader)
+
+
+def parse_config_file(filename: str) -> Mapping[str, Any]:
+    """
+    Parses a YAML or JSON config file. The result is memoized by path and modification time, so the same file is parsed
+    only once per process unless it changes on disk. Since it is shared, it is returned frozen: mappings are read-only
+    and lists are converted into tuples (see thaw to get a mutable copy).
+
+    :param filename:
+    :return:
+    """
+    return _parse_config_file(filename)[1]
+
+
+def _parse_config_file(filename: str) -> Tuple[Tuple[int, int], Mapping[str, Any]]:
+    if not filename.endswith(CONFIG_FILE_EXTENSIONS):
+        raise ValueError(f"Config files should end with one of {', '.join(CONFIG_FILE_EXTENSIONS)} extensions.")
+
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+
+    with _cache_lock:
+        cached = _cache.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached
+
+    with open(path) as f:
+        if path.endswith('.json'):
+            obj = json.load(f)
+        else:
+            import yaml
+            obj = yaml.load(f, Loader=get_yaml_loader())
+
+    obj = _freeze(obj or {})
+
+    with _cache_lock:
+        _cache[path] = (stamp, obj)
+
+    return stamp, obj
+
+
+def clear_cache() -> None:
+    """
+    Drops all the memoized config files and validated configs.
+    """
+    with _cache_lock:
+        _cache.clear()
+        _validated_cache.clear()
+
+
+def merge_configs(base: ConfigDict, overlay: ConfigDict) -> ConfigDict:
+    """
+    Recursively merges overlay into base without mutating any of them. Nested dicts are merged, any other value of
+    overlay replaces the one of base.
+
+    :param base:
+    :param overlay:
+    :return:
+    """
+    result = dict(base)
+
+    for key, value in overlay.items():
+        if isinstance(value, Mapping) and isinstance(result.get(key), Mapping):
+            result[key] = merge_configs(result[key], value)
+        else:
+            result[key] = value
+
+    return result
+
+
+def _normalize_key(key: str) -> str:
+    return key.upper().replace('-', '_')
+
+
+def _parse_env_value(value: str, key: str, base_value: Any) -> Any:
+    if isinstance(base_value, str) or (base_value is None and key not in NON_STRING_KEYS):
+        return value
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def env_to_config_overlay(prefix: str, environ: Optional[Mapping[str, str]] = None, base: Optional[ConfigDict] = None) \
+        -> ConfigDict:
+    """
+    Builds a config overlay out of the environment variables starting with prefix, i.e. with prefix 'PUBSUB'
+    the variable PUBSUB__SUBSCRIPTION_MANAGER_API__TIMEOUT=60 results in {'SUBSCRIPTION-MANAGER-API': {'timeout': 60}}.
+
+    Each part of the variable name is matched against the keys of base case insensitively and with '-' and '_'
+    considered equal. Values are kept as plain strings, unless the value they replace in base is not a string or, if
+    base does not define it, the key is one of NON_STRING_KEYS. In that case they are parsed as JSON, falling back to
+    the plain string if that fails.
+
+    :param prefix:
+    :param environ: defaults to os.environ
+    :param base: the config the overlay will be applied on
+    :return:
+    """
+    environ = os.environ if environ is None else environ
+    base = base or {}
+    start = prefix + ENV_KEY_SEPARATOR
+    overlay: ConfigDict = {}
+
+    for name, value in environ.items():
+        if not name.startswith(start):
+            continue
+
+        parts = name[len(start):].split(ENV_KEY_SEPARATOR)
+        base_level = base
+        overlay_level = overlay
+
+        for depth, part in enumerate(parts):
+            existing = {_normalize_key(k): k for k in base_level} if isinstance(base_level, Mapping) else {}
+            if depth == 0:
+                existing = {**{_normalize_key(section): section for section in SECTIONS}, **existing}
+            key = existing.get(_normalize_key(part), part if depth == 0 else part.lower())
+
+            if depth == len(parts) - 1:
+                base_value = base_level.get(key) if isinstance(base_level, Mapping) else None
+                overlay_level[key] = _parse_env_value(value, key, base_value)
+            else:
+                overlay_level = overlay_level.setdefault(key, {})
+                base_level = base_level.get(key, {}) if isinstance(base_level, Mapping) else {}
+
+    return overlay
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def validate_config(config: ConfigDict) -> FacadeConfig:
+    """
+    Validates the BROKER and SUBSCRIPTION-MANAGER-API sections of a config dict and converts it into a FacadeConfig.
+
+    :param config:
+    :return:
+    """
+    broker = config.get('BROKER')
+    if not isinstance(broker, Mapping):
+        raise ValueError("Missing or invalid 'BROKER' config section")
+    if 'host' not in broker:
+        raise ValueError("Missing 'host' in 'BROKER' config section")
+
+    sm_api = config.get('SUBSCRIPTION-MANAGER-API')
+    if not isinstance(sm_api, Mapping):
+        raise ValueError("Missing or invalid 'SUBSCRIPTION-MANAGER-API' config section")
+    missing = [key for key in SM_API_REQUIRED_KEYS if key not in sm_api]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)} in 'SUBSCRIPTION-MANAGER-API' config section")
+
+    logging_config = config.get('LOGGING')
+
+    return FacadeConfig(
+        broker=_freeze(broker),
+        subscription_manager_api=SubscriptionManagerAPIConfig(**{key: sm_api[key] for key in SM_API_REQUIRED_KEYS}),
+        logging=_freeze(logging_config) if logging_config is not None else None
+    )
+
+
+def load_config(filename: Optional[str] = None,
+                overlays: Iterable[Union[ConfigDict, str]] = (),
+                env_prefix: Optional[str] = None) -> FacadeConfig:
+    """
+    Loads, merges and validates the configuration of a facade. The sources are applied in the following order, each
+    one overriding the previous:
+        - the YAML or JSON config file (memoized, see parse_config_file)
+        - the overlays, either dicts or JSON strings
+        - the environment variables starting with env_prefix (see env_to_config_overlay)
+    The validated config is memoized as well, so that loading the same sources again returns the same FacadeConfig.
+
+    :param filename:
+    :param overlays:
+    :param env_prefix:
+    :return:
+    """
+    overlays = tuple(overlays)
+    stamp, config = _parse_config_file(filename) if filename is not None else (None, {})
+
+    cache_key = _load_cache_key(filename, stamp, overlays, env_prefix)
+    if cache_key is not None:
+        with _cache_lock:
+            cached = _validated_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    for overlay in overlays:
+        if isinstance(overlay, str):
+            overlay = json.loads(overlay)
+        config = merge_configs(config, overlay)
+
+    if env_prefix is not None:
+        config = merge_configs(config, env_to_config_overlay(env_prefix, base=config))
+
+    result = validate_config(config)
+
+    if cache_key is not None:
+        with _cache_lock:
+            # entries of older versions of the file are not needed anymore
+            for key in [key for key in _validated_cache if key[0] == cache_key[0] and key[1] != stamp]:
+                del _validated_cache[key]
+            _validated_cache[cache_key] = result
+
+    return result
+
+
+def _load_cache_key(filename: Optional[str],
+                    stamp: Optional[Tuple[int, int]],
+                    overlays: Iterable[Union[ConfigDict, str]],
+                    env_prefix: Optional[str]) -> Optional[Tuple]:
+    """
+    :return: the key of the validated config in the cache, or None if the overlays cannot be serialized
+    """
+    try:
+        overlays_key = tuple(overlay if isinstance(overlay, str) else json.dumps(overlay, sort_keys=True)
+                             for overlay in overlays)
+    except TypeError:
+        return None
+
+    env_key = None
+    if env_prefix is not None:
+        start = env_prefix + ENV_KEY_SEPARATOR
+        env_key = (env_prefix, tuple(sorted((k, v) for k, v in os.environ.items() if k.startswith(start))))
+
+    path = os.path.abspath(filename) if filename is not None else None
+
+    return path, stamp, overlays_key, env_key
+
+
+def thaw(value: Any) -> Any:
+    """
+    Converts a frozen config value back into plain (mutable) dicts and lists.
+    :param value:
+    :return:
+    """
+    if isinstance(value, Mapping):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
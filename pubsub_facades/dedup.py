@@ -0,0 +1,236 @@
+"""
+Copyright 2019 EUROCONTROL
+==========================================
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+   disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided with the distribution.
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products
+   derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE
+USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+==========================================
+
+Editorial note: this license is an instance of the BSD license template as provided by the Open Source Initiative:
+http://opensource.org/licenses/BSD-3-Clause
+
+Details on EUROCONTROL: http://www.eurocontrol.int
+"""
+
+__author__ = "EUROCONTROL (SWIM)"
+
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from collections.abc import Callable
+from typing import Any, Hashable, Optional
+
+DeduplicationStats = namedtuple('DeduplicationStats', 'received duplicates_dropped false_positive_rate')
+
+
+def message_key(message: Any) -> Hashable:
+    """
+    Returns the id of the message or, if it has none, a hash of its body.
+    :param message: a proton.Message
+    :return:
+    """
+    message_id = getattr(message, 'id', None)
+    if message_id is not None:
+        return message_id
+
+    body = getattr(message, 'body', None)
+    if isinstance(body, memoryview):
+        body = body.tobytes()
+    if isinstance(body, str):
+        body = body.encode()
+    if not isinstance(body, (bytes, bytearray)):
+        body = repr(body).encode()
+
+    return hashlib.blake2b(body, digest_size=16).digest()
+
+
+class WindowedLRUDeduplicator:
+    """
+    Remembers the keys seen within the last `window` seconds, up to `max_size` of them (least recently seen first out).
+    Lookups are exact, so there are no false positives.
+    """
+
+    def __init__(self, max_size: int = 100_000, window: Optional[float] = 3600.):
+        """
+
+        :param max_size:
+        :param window: in seconds, None to only bound by size
+        """
+        self.max_size = max_size
+        self.window = window
+        self._keys: 'OrderedDict[Hashable, float]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _expire(self, now: float) -> None:
+        if self.window is not None:
+            expiry = now - self.window
+            while self._keys and next(iter(self._keys.values())) < expiry:
+                self._keys.popitem(last=False)
+
+    def contains(self, key: Hashable) -> bool:
+        """
+        :param key:
+        :return: whether the key has been recorded within the window
+        """
+        with self._lock:
+            self._expire(time.monotonic())
+
+            return key in self._keys
+
+    def add(self, key: Hashable) -> None:
+        """
+        Records the key
+        :param key:
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            self._expire(now)
+
+            self._keys[key] = now
+            self._keys.move_to_end(key)
+
+            if len(self._keys) > self.max_size:
+                self._keys.popitem(last=False)
+
+    @property
+    def false_positive_rate(self) -> float:
+        return 0.
+
+
+class RotatingBloomDeduplicator:
+    """
+    Keeps two Bloom filters, the current and the previous generation, and rotates them every `capacity` insertions, so
+    memory stays fixed while the keys of the last `capacity` to 2 * `capacity` messages are remembered. Lookups can be
+    false positives, i.e. a new message can be considered as a duplicate.
+    """
+
+    def __init__(self, capacity: int = 100_000, error_rate: float = 0.001):
+        """
+
+        :param capacity: number of insertions per generation
+        :param error_rate: target false positive rate of a full generation
+        """
+        if capacity <= 0 or not 0 < error_rate < 1:
+            raise ValueError("capacity should be positive and error_rate should be within (0, 1)")
+
+        self.capacity = capacity
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+
+        self._current = bytearray((self.num_bits + 7) // 8)
+        self._previous = bytearray(len(self._current))
+        self._current_count = 0
+        self._previous_count = 0
+        self._lock = threading.Lock()
+
+    def _positions(self, key: Hashable):
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    @staticmethod
+    def _contains(bits: bytearray, positions) -> bool:
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in positions)
+
+    def contains(self, key: Hashable) -> bool:
+        """
+        :param key:
+        :return: whether the key has (probably) been recorded in one of the generations
+        """
+        positions = self._positions(key)
+
+        with self._lock:
+            return self._contains(self._current, positions) or self._contains(self._previous, positions)
+
+    def add(self, key: Hashable) -> None:
+        """
+        Records the key in the current generation, rotating the generations if it is full
+        :param key:
+        """
+        positions = self._positions(key)
+
+        with self._lock:
+            if self._contains(self._current, positions):
+                return
+
+            if self._current_count >= self.capacity:
+                self._previous, self._current = self._current, bytearray(len(self._current))
+                self._previous_count, self._current_count = self._current_count, 0
+
+            for p in positions:
+                self._current[p >> 3] |= 1 << (p & 7)
+            self._current_count += 1
+
+    def _generation_false_positive_rate(self, count: int) -> float:
+        return (1 - math.exp(-self.num_hashes * count / self.num_bits)) ** self.num_hashes
+
+    @property
+    def false_positive_rate(self) -> float:
+        """
+        Estimated probability that a new key is reported as seen, given the current fill of both generations.
+        """
+        return 1 - ((1 - self._generation_false_positive_rate(self._current_count)) *
+                    (1 - self._generation_false_positive_rate(self._previous_count)))
+
+
+class DeduplicatingConsumer:
+    """
+    Wraps a message consumer and drops the messages whose key has already been consumed successfully.
+    """
+
+    def __init__(self, message_consumer: Callable, deduplicator, key: Callable = message_key):
+        """
+
+        :param message_consumer:
+        :param deduplicator: a WindowedLRUDeduplicator or RotatingBloomDeduplicator
+        :param key: callable computing the deduplication key of a message
+        """
+        self.message_consumer = message_consumer
+        self.deduplicator = deduplicator
+        self.key = key
+        self.received = 0
+        self.duplicates_dropped = 0
+
+    def __call__(self, message):
+        self.received += 1
+        key = self.key(message)
+
+        if self.deduplicator.contains(key):
+            self.duplicates_dropped += 1
+            return None
+
+        # recorded only once consumed, so that a message whose consumer failed is processed again upon redelivery
+        result = self.message_consumer(message)
+        self.deduplicator.add(key)
+
+        return result
+
+    @property
+    def stats(self) -> DeduplicationStats:
+        return DeduplicationStats(received=self.received,
+                                  duplicates_dropped=self.duplicates_dropped,
+                                  false_positive_rate=self.deduplicator.false_positive_rate)
@@ -0,0 +1,224 @@
+"""
+Copyright 2019 EUROCONTROL
+==========================================
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+   disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided with the distribution.
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products
+   derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE
+USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+==========================================
+
+Editorial note: this license is an instance of the BSD license template as provided by the Open Source Initiative:
+http://opensource.org/licenses/BSD-3-Clause
+
+Details on EUROCONTROL: http://www.eurocontrol.int
+"""
+
+__author__ = "EUROCONTROL (SWIM)"
+
+import math
+import time
+from collections import namedtuple
+from collections.abc import Callable
+from typing import Any, Optional
+
+from pubsub_facades.message_view import MessageView
+
+CreditStats = namedtuple('CreditStats', 'credit buffered_messages buffered_bytes consume_latency')
+
+
+def message_size(message: Any) -> Optional[int]:
+    """
+    :param message: a proton.Message or a MessageView
+    :return: the size of the body in bytes (or of the whole message for views built from the encoded message) if it
+             can be determined cheaply, otherwise None
+    """
+    if isinstance(message, MessageView):
+        # accessing the body would decode the message
+        return message.encoded_size
+
+    body = getattr(message, 'body', None)
+
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        return len(body)
+    if isinstance(body, str):
+        return len(body)
+
+    return None
+
+
+class CreditController:
+    """
+    Wraps the message consumer of a queue, measures how long it takes to consume a message and keeps the credit of the
+    corresponding receiver link close to the number of messages that can be consumed during a round trip to the broker:
+    enough for a fast consumer not to wait for messages, but not more than a slow consumer needs, so that the rest stay
+    in the broker for other instances.
+
+    The credit is kept within [min_credit, max_credit] and the messages buffered locally plus the outstanding credit
+    are bounded by max_buffered_bytes. Credit is issued from within the consumer call, i.e. in the container thread,
+    and upon link events via CreditFlowHandler, which replaces the fixed window flow controller of proton.
+    """
+
+    """ Weight of the latest sample in the moving averages """
+    smoothing = 0.2
+
+    def __init__(self,
+                 message_consumer: Callable,
+                 get_receiver: Callable,
+                 min_credit: int = 1,
+                 max_credit: int = 1000,
+                 round_trip_time: float = 0.1,
+                 max_buffered_bytes: int = 16 * 1024 * 1024):
+        """
+
+        :param message_consumer:
+        :param get_receiver: returns the proton.Receiver of the queue, or None if it cannot be found
+        :param min_credit:
+        :param max_credit:
+        :param round_trip_time: estimated time (in seconds) between issuing credit and receiving the first message
+        :param max_buffered_bytes:
+        """
+        if not 0 < min_credit <= max_credit:
+            raise ValueError("Credit bounds should satisfy 0 < min_credit <= max_credit")
+
+        self.message_consumer = message_consumer
+        self.get_receiver = get_receiver
+        self.min_credit = min_credit
+        self.max_credit = max_credit
+        self.round_trip_time = round_trip_time
+        self.max_buffered_bytes = max_buffered_bytes
+
+        self.consume_latency: Optional[float] = None
+        self.message_size: Optional[float] = None
+        self.target_credit = min_credit
+        self._receiver = None
+
+    def __call__(self, message):
+        start = time.perf_counter()
+        try:
+            return self.message_consumer(message)
+        finally:
+            self._update(time.perf_counter() - start, message_size(message))
+
+    def _average(self, average: Optional[float], sample: float) -> float:
+        return sample if average is None else average + self.smoothing * (sample - average)
+
+    @property
+    def receiver(self):
+        if self._receiver is None:
+            self._receiver = self.get_receiver()
+
+        return self._receiver
+
+    def _update(self, latency: float, size: Optional[int]) -> None:
+        self.consume_latency = self._average(self.consume_latency, latency)
+        if size is not None:
+            self.message_size = self._average(self.message_size, size)
+
+        self.target_credit = self.compute_target_credit()
+        self._apply()
+
+    def compute_target_credit(self) -> int:
+        """
+        :return: the credit needed to cover a round trip given the current consume latency, within the credit bounds
+                 and the buffered bytes budget
+        """
+        if not self.consume_latency:
+            target = self.max_credit
+        else:
+            target = math.ceil(self.round_trip_time / self.consume_latency)
+
+        if self.message_size:
+            buffered = self.receiver.queued if self.receiver is not None else 0
+            target = min(target, int(self.max_buffered_bytes / self.message_size) - buffered)
+
+        return max(self.min_credit, min(self.max_credit, target))
+
+    def _apply(self) -> None:
+        receiver = self.receiver
+        if receiver is not None:
+            self.top_up(receiver)
+
+    def top_up(self, receiver) -> None:
+        """
+        Issues the credit needed for the receiver to reach the target credit. Credit cannot be revoked, so a lower
+        target takes effect as the outstanding credit is consumed.
+
+        :param receiver: a proton.Receiver
+        """
+        if self._receiver is None:
+            self._receiver = receiver
+
+        delta = self.target_credit - receiver.credit
+        if delta > 0:
+            receiver.flow(delta)
+
+    @property
+    def stats(self) -> CreditStats:
+        receiver = self.receiver
+        credit = receiver.credit if receiver is not None else None
+        buffered_messages = receiver.queued if receiver is not None else None
+        buffered_bytes = round(buffered_messages * self.message_size) \
+            if buffered_messages is not None and self.message_size is not None else None
+
+        return CreditStats(credit=credit,
+                           buffered_messages=buffered_messages,
+                           buffered_bytes=buffered_bytes,
+                           consume_latency=self.consume_latency)
+
+
+class CreditFlowHandler:
+    """
+    Child proton handler that replaces the FlowController of the consumer messaging handler, which would otherwise
+    refill every receiver to its fixed prefetch window upon each delivery. The credit of the receivers that have a
+    CreditController is left to it, while the rest keep being refilled to the fixed window.
+    """
+
+    def __init__(self, get_credit_controller: Callable, window: int):
+        """
+
+        :param get_credit_controller: returns the CreditController of a queue, or None
+        :param window: the credit of the receivers without CreditController
+        """
+        self.get_credit_controller = get_credit_controller
+        self.window = window
+
+    def on_link_local_open(self, event) -> None:
+        self._flow(event.link, delivery=False)
+
+    def on_link_remote_open(self, event) -> None:
+        self._flow(event.link, delivery=False)
+
+    def on_link_flow(self, event) -> None:
+        self._flow(event.link, delivery=False)
+
+    def on_delivery(self, event) -> None:
+        self._flow(event.link, delivery=True)
+
+    def _flow(self, link, delivery: bool) -> None:
+        if not link.is_receiver:
+            return
+
+        controller = self.get_credit_controller(link.source.address)
+
+        if controller is None:
+            delta = self.window - link.credit
+            if delta > 0:
+                link.flow(delta)
+        elif not delivery:
+            # upon delivery the credit is topped up once the message has been consumed
+            controller.top_up(link)
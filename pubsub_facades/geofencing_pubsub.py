@@ -30,36 +30,77 @@ Details on EUROCONTROL: http://www.eurocontrol.int
 
 __author__ = "EUROCONTROL (SWIM)"
 
-from collections import Callable, namedtuple
+import logging
+import threading
+from collections import namedtuple
+from collections.abc import Callable, Mapping
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Optional, Tuple
 
-from geofencing_service_client.geofencing_service import GeofencingServiceClient
-from geofencing_service_client.models import UASZonesFilter
-from swim_proton.containers import ConsumerContainer, PubSubContainer
+from pubsub_facades.base import PubSubFacade, SubscriberFacade, lazy_class
+from pubsub_facades.windows import SubscriptionWindow, SubscriptionWindows, SubscriptionStats, to_utc_datetime, \
+    utc_now
 
-from pubsub_facades.base import PubSubFacade
+if TYPE_CHECKING:
+    from geofencing_service_client.models import UASZonesFilter
+    from swim_proton.containers import PubSubContainer
 
 
+_logger = logging.getLogger(__name__)
+
 Subscription = namedtuple('Subscription', 'id queue')
 
 
-class GeofencingSubscriber(PubSubFacade):
+def get_uas_zones_filter_window(uas_zones_filter: 'UASZonesFilter') -> Tuple[Optional[datetime], Optional[datetime]]:
+    """
+    Retrieves the validity period of a UASZonesFilter, given either as a model or as a dict.
+    :param uas_zones_filter:
+    :return: (start, end) as aware datetimes
+    """
+    if isinstance(uas_zones_filter, Mapping):
+        start, end = uas_zones_filter.get('startDateTime'), uas_zones_filter.get('endDateTime')
+    else:
+        start = getattr(uas_zones_filter, 'start_date_time', None)
+        end = getattr(uas_zones_filter, 'end_date_time', None)
+
+    return to_utc_datetime(start), to_utc_datetime(end)
+
+
+class GeofencingSubscriber(SubscriberFacade):
     """ Encapsulates the communication between the Geofencing Service https://github.com/eurocontrol-swim/geofencing-service
         and the broker (RabbitMQ) in a single interface by providing subscriber related functionalities.
     """
 
     """ Is used to instantiate the underlying consumer container that interacts with the broker (AMQP1.0 via swim-qpid-proton)"""
-    container_class = ConsumerContainer
+    container_class = lazy_class('swim_proton.containers.ConsumerContainer')
 
     """ Is used to interact with the subscription management API of 
         https://github.com/eurocontrol-swim/geofencing-servicer"""
-    sm_api_client_class = GeofencingServiceClient
+    sm_api_client_class = lazy_class('geofencing_service_client.geofencing_service.GeofencingServiceClient')
+
+    """ How long before the start of its filter a scheduled subscription is created """
+    activation_lead_time: timedelta = timedelta(minutes=1)
+
+    """ Maximum number of expired subscriptions torn down per housekeeping pass """
+    expiry_batch_size: int = 100
 
-    def __init__(self, container: PubSubContainer, sm_api_client):
+    """ Delay before retrying to create or tear down a subscription, doubled after every consecutive failure up to
+        max_retry_delay """
+    retry_delay: timedelta = timedelta(seconds=30)
+    max_retry_delay: timedelta = timedelta(minutes=30)
+
+    """ Number of retries after which a subscription that keeps failing to be created or torn down is dropped """
+    max_retries: int = 10
+
+    def __init__(self, container: 'PubSubContainer', sm_api_client):
         super().__init__(container, sm_api_client)
 
         """Alias to avoid confusion with Subscription Manager API"""
         self.gs_client = self.sm_api_client
 
+        self.subscription_windows = SubscriptionWindows(lead_time=self.activation_lead_time)
+        self._housekeeping_stop: Optional[threading.Event] = None
+
     @PubSubFacade.require_running
     def preload_queue_message_consumer(self, queue: str, message_consumer: Callable):
         """
@@ -71,10 +112,10 @@ class GeofencingSubscriber(PubSubFacade):
         :param queue:
         :param message_consumer:
         """
-        self.container.consumer.attach_message_consumer(queue=queue, message_consumer=message_consumer)
+        self._attach_message_consumer(queue=queue, message_consumer=message_consumer)
 
     @PubSubFacade.require_running
-    def subscribe(self, uas_zones_filter: UASZonesFilter, message_consumer: Callable) -> Subscription:
+    def subscribe(self, uas_zones_filter: 'UASZonesFilter', message_consumer: Callable) -> Subscription:
         """
         Creates a new subscription in Geofencing Service and registers the message consumer on a new AMQP1.0 receiver
         to be used upon message reception
@@ -83,11 +124,164 @@ class GeofencingSubscriber(PubSubFacade):
         :param message_consumer:
         :return:
         """
-        reply = self.gs_client.post_subscription(uas_zones_filter=uas_zones_filter)
+        start, end = get_uas_zones_filter_window(uas_zones_filter)
+
+        return self._create_subscription(SubscriptionWindow(uas_zones_filter, message_consumer, start, end))
+
+    def _create_subscription(self, window: SubscriptionWindow) -> Subscription:
+        reply = self.gs_client.post_subscription(uas_zones_filter=window.args)
+
+        try:
+            self._attach_message_consumer(reply.publication_location, window.message_consumer)
+        except Exception:
+            self.gs_client.delete_subscription_by_id(reply.subscription_id)
+            raise
+
+        window.subscription = Subscription(id=reply.subscription_id, queue=reply.publication_location)
+        window.failures = 0
+        self.subscription_windows.add_live(window, window.subscription.id)
 
-        self.container.consumer.attach_message_consumer(reply.publication_location, message_consumer)
+        return window.subscription
 
-        return Subscription(id=reply.subscription_id, queue=reply.publication_location)
+    def _tear_down_subscription(self, window: SubscriptionWindow) -> None:
+        if not window.detached:
+            self._detach_message_consumer(queue=window.subscription.queue)
+            window.detached = True
+
+        from rest_client.errors import APIError
+
+        try:
+            self.gs_client.delete_subscription_by_id(window.subscription.id)
+        except APIError as e:
+            # already deleted on the Geofencing Service side
+            if e.status_code != 404:
+                raise
+
+    def _next_retry(self, window: SubscriptionWindow, now: datetime) -> Optional[datetime]:
+        """
+        Records a failed attempt to process the window.
+
+        :param window:
+        :param now:
+        :return: when to retry, or None if the window has failed more than max_retries times in a row
+        """
+        window.failures += 1
+
+        if window.failures > self.max_retries:
+            return None
+
+        return now + min(self.retry_delay * 2 ** (window.failures - 1), self.max_retry_delay)
+
+    @PubSubFacade.require_running
+    def schedule_subscription(self, uas_zones_filter: 'UASZonesFilter', message_consumer: Callable) \
+            -> SubscriptionWindow:
+        """
+        Same as subscribe but the subscription is created only shortly (activation_lead_time) before the start of the
+        filter. Subscriptions that are already due are created right away. The creation of the rest happens in
+        process_subscription_windows.
+
+        :param uas_zones_filter:
+        :param message_consumer:
+        :return: the window of the subscription, whose subscription attribute is set upon creation
+        """
+        start, end = get_uas_zones_filter_window(uas_zones_filter)
+        window = SubscriptionWindow(uas_zones_filter, message_consumer, start, end)
+
+        if self.subscription_windows.is_due(window, utc_now()):
+            self._create_subscription(window)
+        else:
+            self.subscription_windows.add_pending(window)
+
+        return window
+
+    def cancel_subscription_window(self, window: SubscriptionWindow) -> None:
+        """
+        Stops tracking a scheduled subscription and unsubscribes it if it has already been created.
+
+        :param window:
+        """
+        subscription = window.subscription
+
+        self.subscription_windows.cancel(window)
+
+        if subscription is not None:
+            self.unsubscribe(subscription.id)
+
+    @PubSubFacade.require_running
+    def process_subscription_windows(self, now: Optional[datetime] = None) -> None:
+        """
+        Creates the scheduled subscriptions that are due and tears down up to expiry_batch_size expired ones. Expired
+        subscriptions are removed without looking them up in Geofencing Service, since their queue is already known.
+        Windows that fail to be processed are registered again to be retried after retry_delay (backing off
+        exponentially) and are dropped after max_retries consecutive failures.
+
+        :param now: defaults to the current UTC time
+        """
+        now = now or utc_now()
+
+        for window in self.subscription_windows.pop_due(now):
+            if window.cancelled or (window.end is not None and window.end <= now):
+                continue
+            try:
+                self._create_subscription(window)
+            except Exception:
+                _logger.exception(f"Failed to create scheduled subscription {window}")
+                retry_at = self._next_retry(window, now)
+                if retry_at is None:
+                    _logger.error(f"Giving up creating scheduled subscription {window}")
+                else:
+                    self.subscription_windows.add_pending(window, when=retry_at)
+                continue
+
+            # cancelled while being created
+            if window.cancelled:
+                self.unsubscribe(window.subscription.id)
+
+        for window in self.subscription_windows.pop_expired(now, limit=self.expiry_batch_size):
+            try:
+                self._tear_down_subscription(window)
+            except Exception:
+                _logger.exception(f"Failed to tear down expired subscription {window}")
+                retry_at = self._next_retry(window, now)
+                if retry_at is None:
+                    _logger.error(f"Giving up tearing down expired subscription {window}")
+                else:
+                    self.subscription_windows.add_live(window, window.subscription.id, when=retry_at)
+
+    def subscription_stats(self, now: Optional[datetime] = None) -> SubscriptionStats:
+        """
+        :param now: defaults to the current UTC time
+        :return: the number of pending, live and expired (not torn down yet) subscriptions tracked by the subscriber
+        """
+        return self.subscription_windows.stats(now or utc_now())
+
+    def start_housekeeping(self, interval: float = 60.) -> None:
+        """
+        Runs process_subscription_windows every interval seconds in a daemon thread.
+
+        :param interval:
+        """
+        if self._housekeeping_stop is not None:
+            return
+
+        stop = self._housekeeping_stop = threading.Event()
+
+        def housekeeping():
+            while not stop.wait(interval):
+                try:
+                    self.process_subscription_windows()
+                except Exception:
+                    _logger.exception("Subscription housekeeping failed")
+
+        threading.Thread(target=housekeeping, name='geofencing-subscriptions-housekeeping', daemon=True).start()
+
+    def stop_housekeeping(self) -> None:
+        """
+        Stops the thread started by start_housekeeping
+        """
+        if self._housekeeping_stop is not None:
+            self._housekeeping_stop.set()
+            self._housekeeping_stop = None
 
     @PubSubFacade.require_running
     def pause(self, subscription_id: str) -> None:
@@ -127,8 +321,14 @@ class GeofencingSubscriber(PubSubFacade):
         """
         uas_zone_subscription_reply = self.gs_client.get_subscription_by_id(subscription_id)
 
-        self.container.consumer.detach_message_consumer(
-            queue=uas_zone_subscription_reply.subscription.publication_location)
+        self._detach_message_consumer(queue=uas_zone_subscription_reply.subscription.publication_location)
+
+        window = self.subscription_windows.get_live(subscription_id)
+        if window is not None:
+            window.detached = True
 
         self.gs_client.delete_subscription_by_id(subscription_id)
 
+        # stop tracking it only once it is gone, so that a failed call leaves it to be torn down upon expiry
+        self.subscription_windows.cancel_by_subscription_id(subscription_id)
+
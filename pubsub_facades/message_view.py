@@ -0,0 +1,290 @@
+"""
+Copyright 2019 EUROCONTROL
+==========================================
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+   disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided with the distribution.
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products
+   derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE
+USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+==========================================
+
+Editorial note: this license is an instance of the BSD license template as provided by the Open Source Initiative:
+http://opensource.org/licenses/BSD-3-Clause
+
+Details on EUROCONTROL: http://www.eurocontrol.int
+"""
+
+__author__ = "EUROCONTROL (SWIM)"
+
+import json
+from collections.abc import Callable
+from typing import Any, Dict, Optional, Union
+
+""" Consumers receive a MessageView instead of a proton.Message """
+VIEW = 'view'
+
+""" Consumers receive the AMQP encoded message as a memoryview (see MessageView.encoded), to be forwarded as it is """
+PASS_THROUGH = 'pass-through'
+
+MESSAGE_VIEW_MODES = (VIEW, PASS_THROUGH)
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+def body_to_memoryview(body: Any) -> Optional[memoryview]:
+    """
+    Exposes a binary body without copying it. Text bodies are encoded in UTF-8.
+    :param body:
+    :return: None if the body is neither binary nor text
+    """
+    if isinstance(body, memoryview):
+        return body
+    if isinstance(body, (bytes, bytearray)):
+        return memoryview(body)
+    if isinstance(body, str):
+        return memoryview(body.encode())
+
+    return None
+
+
+class MessageView:
+    """
+    Lightweight read-only view of an AMQP message, whose payload is exposed as a memoryview and decoded only upon
+    request.
+
+    The view can be built either from a proton.Message or from the encoded bytes of a message, as received by
+    MessageViewDeliveryHandler. In the latter case the message is decoded only when one of its fields is accessed, so
+    consumers that forward the encoded bytes as they are do not pay for decoding it at all.
+    """
+
+    __slots__ = ('_message', '_encoded', '_payload', '_decoded')
+
+    _UNSET = object()
+
+    def __init__(self, message=None, encoded: Optional[Buffer] = None):
+        """
+
+        :param message: a proton.Message
+        :param encoded: the AMQP encoded message
+        """
+        if message is None and encoded is None:
+            raise ValueError("Either a message or its encoded bytes should be provided")
+
+        self._message = message
+        self._encoded = memoryview(encoded) if encoded is not None else None
+        self._payload = self._UNSET
+        self._decoded = self._UNSET
+
+    @property
+    def message(self):
+        """
+        The underlying proton.Message, decoded from the encoded bytes on first access if needed.
+        """
+        if self._message is None:
+            import proton
+
+            message = proton.Message()
+            message.decode(self._encoded.tobytes())
+            self._message = message
+
+        return self._message
+
+    @property
+    def id(self) -> Any:
+        return self.message.id
+
+    @property
+    def correlation_id(self) -> Any:
+        return self.message.correlation_id
+
+    @property
+    def subject(self) -> Optional[str]:
+        return self.message.subject
+
+    @property
+    def content_type(self) -> Optional[str]:
+        return self.message.content_type
+
+    @property
+    def content_encoding(self) -> Optional[str]:
+        return self.message.content_encoding
+
+    @property
+    def creation_time(self) -> Optional[float]:
+        return self.message.creation_time
+
+    @property
+    def durable(self) -> bool:
+        return self.message.durable
+
+    @property
+    def priority(self) -> int:
+        return self.message.priority
+
+    @property
+    def properties(self) -> Dict:
+        """ The application properties of the message """
+        return self.message.properties or {}
+
+    @property
+    def annotations(self) -> Dict:
+        return self.message.annotations or {}
+
+    @property
+    def body(self) -> Any:
+        """ The body as decoded by proton, i.e. bytes, str or a dict for AMQP maps """
+        return self.message.body
+
+    @property
+    def payload(self) -> Optional[memoryview]:
+        """
+        The body as a memoryview, without copying it if it is binary. None if the body is neither binary nor text.
+        """
+        if self._payload is self._UNSET:
+            self._payload = body_to_memoryview(self.message.body)
+
+        return self._payload
+
+    @property
+    def encoded(self) -> memoryview:
+        """
+        The AMQP encoded message. It is the original buffer if the view was built from one, otherwise the message is
+        encoded.
+        """
+        if self._encoded is None:
+            self._encoded = memoryview(self.message.encode())
+
+        return self._encoded
+
+    @property
+    def encoded_size(self) -> Optional[int]:
+        """
+        The size of the encoded message if the view was built from it (or it has already been encoded), otherwise None
+        """
+        return len(self._encoded) if self._encoded is not None else None
+
+    def decode(self, decoder: Optional[Callable] = None) -> Any:
+        """
+        Decodes the payload. Without decoder, the payload is decoded once and the result is cached. By default, JSON
+        content types are parsed, text content types are decoded into str (using the charset parameter of the content
+        type, UTF-8 otherwise) and any other body is returned as decoded by proton.
+
+        :param decoder: a callable accepting the payload memoryview, whose result is not cached
+        :return:
+        """
+        if decoder is not None:
+            return decoder(self.payload)
+
+        if self._decoded is self._UNSET:
+            self._decoded = self._default_decode()
+
+        return self._decoded
+
+    def _default_decode(self) -> Any:
+        media_type, *parameters = (self.content_type or '').split(';')
+        media_type = media_type.strip().lower()
+        payload = self.payload
+
+        if payload is None:
+            return self.body
+        if media_type == 'application/json' or media_type.endswith('+json'):
+            return json.loads(payload.tobytes())
+        if media_type.startswith('text/'):
+            charset = 'utf-8'
+            for parameter in parameters:
+                name, _, value = parameter.partition('=')
+                if name.strip().lower() == 'charset':
+                    charset = value.strip().strip('"')
+            return str(payload, charset)
+
+        return self.body
+
+    def __repr__(self):
+        return f"MessageView(id={self.id!r}, content_type={self.content_type!r})"
+
+
+class MessageViewConsumer:
+    """
+    Wraps a message consumer in order to pass it a MessageView (VIEW mode) or the AMQP encoded message (PASS_THROUGH
+    mode) instead of the proton.Message. The messages received as MessageView objects (see MessageViewDeliveryHandler)
+    are passed on without being decoded, otherwise the proton.Message is wrapped in a view (and encoded again in
+    PASS_THROUGH mode).
+    """
+
+    def __init__(self, message_consumer: Callable, mode: str = VIEW):
+        if mode not in MESSAGE_VIEW_MODES:
+            raise ValueError(f"Invalid message view mode '{mode}'. Should be one of {', '.join(MESSAGE_VIEW_MODES)}")
+
+        self.message_consumer = message_consumer
+        self.mode = mode
+
+    def __call__(self, message):
+        view = message if isinstance(message, MessageView) else MessageView(message)
+
+        return self.message_consumer(view if self.mode == VIEW else view.encoded)
+
+
+class MessageViewDeliveryHandler:
+    """
+    Child proton handler that replaces the IncomingMessageHandler of the consumer messaging handler. The deliveries of
+    the queues whose consumer expects message views are read as raw bytes and passed on as a MessageView built from
+    them, instead of being decoded into a proton.Message beforehand. The rest are left to the replaced handler.
+    """
+
+    def __init__(self, incoming_message_handler, is_view_queue: Callable):
+        """
+
+        :param incoming_message_handler: the replaced proton.handlers.IncomingMessageHandler
+        :param is_view_queue: tells whether the consumer of a queue expects message views
+        """
+        self.incoming_message_handler = incoming_message_handler
+        self.is_view_queue = is_view_queue
+
+    def on_delivery(self, event) -> None:
+        delivery = event.delivery
+        link = delivery.link
+
+        if not (link.is_receiver and delivery.readable and not delivery.partial and not delivery.aborted
+                and self.is_view_queue(link.source.address)):
+            self.incoming_message_handler.on_delivery(event)
+            return
+
+        from proton import Delivery, Endpoint
+        from proton.handlers import Reject, Release
+
+        event.message = MessageView(encoded=link.recv(delivery.pending))
+        link.advance()
+
+        # same outcome as with proton.handlers.IncomingMessageHandler
+        auto_accept = self.incoming_message_handler.auto_accept
+        if link.state & Endpoint.LOCAL_CLOSED:
+            if auto_accept:
+                delivery.update(Delivery.RELEASED)
+                delivery.settle()
+            return
+
+        try:
+            self.incoming_message_handler.on_message(event)
+            if auto_accept:
+                delivery.update(Delivery.ACCEPTED)
+                delivery.settle()
+        except Reject:
+            delivery.update(Delivery.REJECTED)
+            delivery.settle()
+        except Release:
+            delivery.update(Delivery.MODIFIED)
+            delivery.settle()
@@ -30,15 +30,19 @@ Details on EUROCONTROL: http://www.eurocontrol.int
 
 __author__ = "EUROCONTROL (SWIM)"
 
+import logging
 from collections.abc import Callable
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Dict, Iterable, TYPE_CHECKING
 
-from subscription_manager_client.subscription_manager import SubscriptionManagerClient
-from subscription_manager_client.models import Topic, Subscription
-from swim_proton.containers import ProducerContainer, ConsumerContainer
-from swim_proton.messaging_handlers import Messenger
+from pubsub_facades.base import PubSubFacade, SubscriberFacade, lazy_class
+from pubsub_facades.topic_index import TopicPattern, TopicTrie
 
-from pubsub_facades.base import PubSubFacade
+if TYPE_CHECKING:
+    from subscription_manager_client.models import Topic, Subscription
+    from swim_proton.messaging_handlers import Messenger
+
+
+_logger = logging.getLogger(__name__)
 
 
 class SWIMPublisher(PubSubFacade):
@@ -47,13 +51,13 @@ class SWIMPublisher(PubSubFacade):
     """
 
     """ Is used to instantiate the underlying producer container that interacts with the broker (AMQP1.0 via swim-qpid-proton)"""
-    container_class = ProducerContainer
+    container_class = lazy_class('swim_proton.containers.ProducerContainer')
 
     """ Is used to interact with the subscription management API of 
         https://github.com/eurocontrol-swim/subscription-manager"""
-    sm_api_client_class = SubscriptionManagerClient
+    sm_api_client_class = lazy_class('subscription_manager_client.subscription_manager.SubscriptionManagerClient')
 
-    def _get_topic_by_name(self, topic_name: str) -> Optional[Topic]:
+    def _get_topic_by_name(self, topic_name: str) -> Optional['Topic']:
         """
         Retrieves a SubscriptionManager Topic object by its name
         :param topic_name:
@@ -68,13 +72,15 @@ class SWIMPublisher(PubSubFacade):
 
         return result
 
-    def _get_or_create_sm_topic(self, topic_name: str) -> Topic:
+    def _get_or_create_sm_topic(self, topic_name: str) -> 'Topic':
         """
         Retrieves a SubscriptionManager Topic or creates it if it does not exist.
 
         :param topic_name:
         :return:
         """
+        from subscription_manager_client.models import Topic
+
         result = self._get_topic_by_name(topic_name)
 
         if result is None:
@@ -82,7 +88,7 @@ class SWIMPublisher(PubSubFacade):
 
         return result
 
-    def pre_schedule_messenger(self, messenger: Messenger):
+    def pre_schedule_messenger(self, messenger: 'Messenger'):
         """
         Registers the message producer on an existing topic.
 
@@ -98,7 +104,7 @@ class SWIMPublisher(PubSubFacade):
 
         self.container.producer.schedule_messenger(messenger)
 
-    def add_topic_messenger(self, messenger: Messenger) -> Topic:
+    def add_topic_messenger(self, messenger: 'Messenger') -> 'Topic':
         """
         Adds a new topic in SubscriptionManager and registers the message_producer in order to be used for message
         sending in the broker.
@@ -113,7 +119,7 @@ class SWIMPublisher(PubSubFacade):
         return topic
 
     @PubSubFacade.require_running
-    def publish_topic_messenger(self, messenger: Messenger, context: Optional[Any] = None):
+    def publish_topic_messenger(self, messenger: 'Messenger', context: Optional[Any] = None):
         """
         Triggers the topic send on demand by providing optional context that will be used in producing the message to
         be send in the broker.
@@ -124,17 +130,137 @@ class SWIMPublisher(PubSubFacade):
         self.container.producer.trigger_messenger(messenger, context=context)
 
 
-class SWIMSubscriber(PubSubFacade):
+class PatternSubscription:
+    """ Groups the subscriptions created for the topics matching a TopicPattern """
+
+    def __init__(self, pattern: TopicPattern, message_consumer: Callable):
+        self.pattern = pattern
+        self.message_consumer = message_consumer
+
+        """ subscriptions by topic name """
+        self.subscriptions: Dict[str, 'Subscription'] = {}
+
+    def __repr__(self):
+        return f"PatternSubscription({self.pattern.pattern!r}, topics={sorted(self.subscriptions)})"
+
+
+class SWIMSubscriber(SubscriberFacade):
     """ Encapsulates the communication between the SubscriptionManager https://github.com/eurocontrol-swim/subscription-manager
         and the broker (RabbitMQ) in a single interface by providing subscriber related functionalities.
     """
 
     """ Is used to instantiate the underlying consumer container that interacts with the broker (AMQP1.0 via swim-qpid-proton)"""
-    container_class = ConsumerContainer
+    container_class = lazy_class('swim_proton.containers.ConsumerContainer')
 
     """ Is used to interact with the subscription management API of 
         https://github.com/eurocontrol-swim/subscription-manager"""
-    sm_api_client_class = SubscriptionManagerClient
+    sm_api_client_class = lazy_class('subscription_manager_client.subscription_manager.SubscriptionManagerClient')
+
+    def __init__(self, container, sm_api_client):
+        super().__init__(container, sm_api_client)
+
+        self.topic_index = TopicTrie()
+        self.pattern_subscriptions: List[PatternSubscription] = []
+
+    def _index_topics(self, topics: Iterable['Topic']) -> List['Topic']:
+        """
+        Adds the given topics in the topic index
+        :param topics:
+        :return: the topics that were not indexed before
+        """
+        new_topics = []
+        for topic in topics:
+            indexed = self.topic_index.get(topic.name)
+            if indexed is None or indexed.id != topic.id:
+                new_topics.append(topic)
+            self.topic_index.insert(topic.name, topic)
+
+        return new_topics
+
+    def _subscribe_new_topics(self, topics: Iterable['Topic']) -> List['Subscription']:
+        """
+        Subscribes the active pattern subscriptions to the given (new) topics they match.
+        :param topics:
+        :return: the created subscriptions
+        """
+        result = []
+        for topic in topics:
+            for pattern_subscription in self.pattern_subscriptions:
+                if topic.name in pattern_subscription.subscriptions:
+                    # the topic has been re-created under the same name
+                    self._drop_pattern_topic_subscription(pattern_subscription, topic.name)
+                if pattern_subscription.pattern.matches(topic.name):
+                    subscription = self._subscribe_topic(topic, pattern_subscription.message_consumer)
+                    pattern_subscription.subscriptions[topic.name] = subscription
+                    result.append(subscription)
+
+        return result
+
+    def _drop_pattern_topic_subscription(self, pattern_subscription: PatternSubscription, topic_name: str) -> None:
+        """
+        Unsubscribes a pattern subscription from a topic that no longer exists (or has been re-created). The receiver is
+        detached first and failures are only logged, since the subscription may have been deleted along with the topic.
+
+        :param pattern_subscription:
+        :param topic_name:
+        """
+        self._unsubscribe_quietly(pattern_subscription.subscriptions.pop(topic_name))
+
+    def _unsubscribe_quietly(self, subscription: 'Subscription') -> None:
+        """
+        Detaches the message consumer of the subscription and deletes it from Subscription Manager, logging failures.
+        :param subscription:
+        """
+        try:
+            self._detach_message_consumer(subscription.queue)
+        except Exception:
+            _logger.exception(f"Failed to detach the message consumer of queue {subscription.queue}")
+
+        try:
+            self.sm_api_client.delete_subscription_by_id(subscription.id)
+        except Exception:
+            _logger.exception(f"Failed to delete subscription {subscription.id}")
+
+    def _subscribe_topic(self, topic: 'Topic', message_consumer: Callable) -> 'Subscription':
+        from subscription_manager_client.models import Subscription
+
+        subscription = self.sm_api_client.post_subscription(subscription=Subscription(topic_id=topic.id))
+
+        self._attach_message_consumer(subscription.queue, message_consumer)
+
+        return subscription
+
+    @PubSubFacade.require_running
+    def sync_topics(self) -> List['Subscription']:
+        """
+        Refreshes the topic index from Subscription Manager. Only the topics that were not indexed before are checked
+        against the active pattern subscriptions, which get subscribed to the ones they match. The pattern subscriptions
+        to topics that no longer exist are dropped.
+
+        :return: the subscriptions created for the new topics
+        """
+        topics: List['Topic'] = self.sm_api_client.get_topics()
+
+        current_names = {topic.name for topic in topics}
+        for topic in self.topic_index.match(TopicPattern('#')):
+            if topic.name not in current_names:
+                self.topic_index.remove(topic.name)
+                for pattern_subscription in self.pattern_subscriptions:
+                    if topic.name in pattern_subscription.subscriptions:
+                        self._drop_pattern_topic_subscription(pattern_subscription, topic.name)
+
+        return self._subscribe_new_topics(self._index_topics(topics))
+
+    @PubSubFacade.require_running
+    def on_topic_created(self, topic: 'Topic') -> List['Subscription']:
+        """
+        Indexes a newly created topic without refreshing the whole topic list and subscribes the active pattern
+        subscriptions that match it.
+
+        :param topic:
+        :return: the created subscriptions
+        """
+        return self._subscribe_new_topics(self._index_topics([topic]))
 
     @PubSubFacade.require_running
     def preload_queue_message_consumer(self, queue: str, message_consumer: Callable):
@@ -147,10 +273,10 @@ class SWIMSubscriber(PubSubFacade):
         :param queue:
         :param message_consumer:
         """
-        self.container.consumer.attach_message_consumer(queue=queue, message_consumer=message_consumer)
+        self._attach_message_consumer(queue=queue, message_consumer=message_consumer)
 
     @PubSubFacade.require_running
-    def subscribe(self, topic_name: str, message_consumer: Callable) -> Subscription:
+    def subscribe(self, topic_name: str, message_consumer: Callable) -> 'Subscription':
         """
         Creates a new subscription in Subscription Manager and registers the message consumer on a new AMQP1.0 receiver
         to be used upon message reception
@@ -159,21 +285,58 @@ class SWIMSubscriber(PubSubFacade):
         :param message_consumer:
         :return:
         """
-        topics: List[Topic] = self.sm_api_client.get_topics()
+        topics: List['Topic'] = self.sm_api_client.get_topics()
 
-        try:
-            topic = [topic for topic in topics if topic.name == topic_name][0]
-        except AttributeError:
+        topic = next((topic for topic in topics if topic.name == topic_name), None)
+
+        if topic is None:
             raise ValueError(f"No topic found with name {topic_name}")
 
-        subscription = self.sm_api_client.post_subscription(subscription=Subscription(topic_id=topic.id))
+        return self._subscribe_topic(topic, message_consumer)
 
-        self.container.consumer.attach_message_consumer(subscription.queue, message_consumer)
+    @PubSubFacade.require_running
+    def subscribe_pattern(self, pattern: str, message_consumer: Callable) -> PatternSubscription:
+        """
+        Subscribes to all the topics whose name matches the pattern, i.e. 'arrivals.EBBR.#' (see TopicPattern).
+        Topics that are created later and match the pattern are subscribed upon sync_topics or on_topic_created. If one
+        of the subscriptions fails to be created, the ones already created are rolled back.
 
-        return subscription
+        :param pattern:
+        :param message_consumer:
+        :return:
+        """
+        pattern_subscription = PatternSubscription(TopicPattern(pattern), message_consumer)
+
+        self.sync_topics()
+
+        try:
+            for topic in self.topic_index.match(pattern_subscription.pattern):
+                pattern_subscription.subscriptions[topic.name] = self._subscribe_topic(topic, message_consumer)
+        except Exception:
+            for subscription in pattern_subscription.subscriptions.values():
+                self._unsubscribe_quietly(subscription)
+            raise
+
+        self.pattern_subscriptions.append(pattern_subscription)
+
+        return pattern_subscription
+
+    @PubSubFacade.require_running
+    def unsubscribe_pattern(self, pattern_subscription: PatternSubscription) -> None:
+        """
+        Stops following the pattern and unsubscribes all of its subscriptions.
+
+        :param pattern_subscription:
+        """
+        self.pattern_subscriptions.remove(pattern_subscription)
+
+        for subscription in pattern_subscription.subscriptions.values():
+            self.unsubscribe(subscription)
+
+        pattern_subscription.subscriptions.clear()
 
     @PubSubFacade.require_running
-    def pause(self, subscription: Subscription) -> Subscription:
+    def pause(self, subscription: 'Subscription') -> 'Subscription':
         """
         Updates (deactivates) the subscription's state by setting it to False in Subscription Manager.
         Upon successful action the corresponding queue will be unbound from the relative topic and no message will be
@@ -190,7 +353,7 @@ class SWIMSubscriber(PubSubFacade):
         return subscription
 
     @PubSubFacade.require_running
-    def resume(self, subscription: Subscription) -> Subscription:
+    def resume(self, subscription: 'Subscription') -> 'Subscription':
         """
         Updates (reactivates) the subscription's state by setting it to True in Subscription Manager.
         Upon successful action the corresponding queue will be rebound to the relative topic and messages will start
@@ -207,7 +370,7 @@ class SWIMSubscriber(PubSubFacade):
         return subscription
 
     @PubSubFacade.require_running
-    def unsubscribe(self, subscription: Subscription) -> None:
+    def unsubscribe(self, subscription: 'Subscription') -> None:
         """
         Deletes the subscription from the Subscription Manager, cleans up the corresponding queue in broker and removes
         the registered receiver.
@@ -216,4 +379,4 @@ class SWIMSubscriber(PubSubFacade):
         """
         self.sm_api_client.delete_subscription_by_id(subscription.id)
 
-        self.container.consumer.detach_message_consumer(subscription.queue)
+        self._detach_message_consumer(subscription.queue)
@@ -0,0 +1,194 @@
+"""
+Copyright 2019 EUROCONTROL
+==========================================
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+   disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided with the distribution.
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products
+   derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE
+USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+==========================================
+
+Editorial note: this license is an instance of the BSD license template as provided by the Open Source Initiative:
+http://opensource.org/licenses/BSD-3-Clause
+
+Details on EUROCONTROL: http://www.eurocontrol.int
+"""
+
+__author__ = "EUROCONTROL (SWIM)"
+
+from fnmatch import fnmatchcase
+from typing import Any, Dict, Iterator, List, Optional
+
+SEPARATOR = '.'
+
+""" Matches exactly one segment of a topic name """
+SINGLE_SEGMENT_WILDCARD = '*'
+
+""" Matches zero or more segments of a topic name """
+MULTI_SEGMENT_WILDCARD = '#'
+
+
+def _is_literal(segment: str) -> bool:
+    return not any(char in segment for char in '*?[')
+
+
+class TopicPattern:
+    """
+    Pattern matching dot separated topic names, i.e. 'arrivals.EBBR.#'. Each segment is either:
+        - '#' which matches zero or more segments
+        - a glob (fnmatch) expression which matches exactly one segment, i.e. '*' or 'EB*'
+        - a literal segment
+    """
+
+    def __init__(self, pattern: str):
+        if not pattern:
+            raise ValueError("Topic pattern cannot be empty")
+
+        self.pattern = pattern
+        self.segments = pattern.split(SEPARATOR)
+
+    def __repr__(self):
+        return f"TopicPattern({self.pattern!r})"
+
+    def __eq__(self, other):
+        return isinstance(other, TopicPattern) and self.pattern == other.pattern
+
+    def __hash__(self):
+        return hash(self.pattern)
+
+    def matches(self, topic_name: str) -> bool:
+        return self._matches(self.segments, topic_name.split(SEPARATOR))
+
+    @classmethod
+    def _matches(cls, pattern_segments: List[str], name_segments: List[str]) -> bool:
+        if not pattern_segments:
+            return not name_segments
+
+        head, rest = pattern_segments[0], pattern_segments[1:]
+
+        if head == MULTI_SEGMENT_WILDCARD:
+            return any(cls._matches(rest, name_segments[i:]) for i in range(len(name_segments) + 1))
+
+        if not name_segments or not fnmatchcase(name_segments[0], head):
+            return False
+
+        return cls._matches(rest, name_segments[1:])
+
+
+class _Node:
+    __slots__ = ('children', 'topic')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        self.topic: Optional[Any] = None
+
+
+class TopicTrie:
+    """
+    Index of topics by the segments of their name. Literal pattern segments are resolved with a single lookup, so that
+    matching a prefix only visits the topics under it.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, topic_name: str):
+        return self.get(topic_name) is not None
+
+    def insert(self, topic_name: str, topic: Any) -> None:
+        """
+        Adds (or replaces) a topic
+        :param topic_name:
+        :param topic:
+        """
+        node = self._root
+        for segment in topic_name.split(SEPARATOR):
+            node = node.children.setdefault(segment, _Node())
+
+        if node.topic is None:
+            self._size += 1
+        node.topic = topic
+
+    def remove(self, topic_name: str) -> Optional[Any]:
+        """
+        Removes a topic and prunes the nodes that are left empty
+        :param topic_name:
+        :return: the removed topic if it existed
+        """
+        path = [self._root]
+        segments = topic_name.split(SEPARATOR)
+        for segment in segments:
+            node = path[-1].children.get(segment)
+            if node is None:
+                return None
+            path.append(node)
+
+        topic, path[-1].topic = path[-1].topic, None
+        if topic is None:
+            return None
+        self._size -= 1
+
+        for segment, parent, node in zip(reversed(segments), reversed(path[:-1]), reversed(path[1:])):
+            if node.children or node.topic is not None:
+                break
+            del parent.children[segment]
+
+        return topic
+
+    def get(self, topic_name: str) -> Optional[Any]:
+        node = self._root
+        for segment in topic_name.split(SEPARATOR):
+            node = node.children.get(segment)
+            if node is None:
+                return None
+
+        return node.topic
+
+    def match(self, pattern: TopicPattern) -> List[Any]:
+        """
+        :param pattern:
+        :return: the topics whose name matches the pattern
+        """
+        # consecutive '#' segments may reach the same topic through different paths
+        return list({id(topic): topic for topic in self._match(self._root, pattern.segments, 0)}.values())
+
+    def _match(self, node: _Node, segments: List[str], index: int) -> Iterator[Any]:
+        if index == len(segments):
+            if node.topic is not None:
+                yield node.topic
+            return
+
+        segment = segments[index]
+
+        if segment == MULTI_SEGMENT_WILDCARD:
+            # '#' matching zero segments at this node
+            yield from self._match(node, segments, index + 1)
+            # '#' consuming one more segment (and possibly more, via recursion)
+            for child in node.children.values():
+                yield from self._match(child, segments, index)
+        elif _is_literal(segment):
+            child = node.children.get(segment)
+            if child is not None:
+                yield from self._match(child, segments, index + 1)
+        else:
+            for name, child in node.children.items():
+                if fnmatchcase(name, segment):
+                    yield from self._match(child, segments, index + 1)
@@ -0,0 +1,255 @@
+"""
+Copyright 2019 EUROCONTROL
+==========================================
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+   disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided with the distribution.
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products
+   derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE
+USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+==========================================
+
+Editorial note: this license is an instance of the BSD license template as provided by the Open Source Initiative:
+http://opensource.org/licenses/BSD-3-Clause
+
+Details on EUROCONTROL: http://www.eurocontrol.int
+"""
+
+__author__ = "EUROCONTROL (SWIM)"
+
+import heapq
+import itertools
+import threading
+from collections import namedtuple
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+SubscriptionStats = namedtuple('SubscriptionStats', 'pending live expired')
+
+
+def to_utc_datetime(value: Any) -> Optional[datetime]:
+    """
+    Converts an ISO 8601 string or a datetime into an aware datetime. Naive values are considered to be in UTC.
+    :param value:
+    :return:
+    """
+    if value is None:
+        return None
+
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+
+    return value
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class SubscriptionWindow:
+    """
+    Keeps track of a subscription that is valid within [start, end]. The subscription itself is None as long as it has
+    not been created yet.
+    """
+
+    __slots__ = ('args', 'message_consumer', 'start', 'end', 'subscription', 'cancelled', 'tracked', 'detached',
+                 'failures')
+
+    def __init__(self, args: Any, message_consumer: Callable, start: Optional[datetime], end: Optional[datetime]):
+        """
+
+        :param args: the data needed to create the subscription, i.e. a UASZonesFilter
+        :param message_consumer:
+        :param start: None stands for an already valid subscription
+        :param end: None stands for a subscription that never expires
+        """
+        self.args = args
+        self.message_consumer = message_consumer
+        self.start = start
+        self.end = end
+        self.subscription = None
+        self.cancelled = False
+
+        """ Whether the window is in one of the heaps of SubscriptionWindows, False while it is being processed """
+        self.tracked = False
+
+        """ Whether the message consumer has been detached during the teardown of the subscription """
+        self.detached = False
+
+        """ Number of consecutive failed attempts to create or tear down the subscription """
+        self.failures = 0
+
+    def __repr__(self):
+        return f"SubscriptionWindow(start={self.start}, end={self.end}, subscription={self.subscription})"
+
+
+class SubscriptionWindows:
+    """
+    Time ordered registry of subscription windows. Two heaps are maintained:
+        - pending windows ordered by the time their subscription should be created (start - lead_time)
+        - live windows ordered by their end
+
+    Removed windows are flagged as cancelled and dropped lazily once they reach the top of their heap.
+    """
+
+    def __init__(self, lead_time: timedelta):
+        """
+
+        :param lead_time: how long before its start a pending subscription is due to be created
+        """
+        self.lead_time = lead_time
+        self._pending: List[Tuple[datetime, int, SubscriptionWindow]] = []
+        self._live: List[Tuple[datetime, int, SubscriptionWindow]] = []
+        self._live_by_id: Dict[Any, SubscriptionWindow] = {}
+        self._pending_count = 0
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def is_due(self, window: SubscriptionWindow, now: datetime) -> bool:
+        return window.start is None or window.start - self.lead_time <= now
+
+    def add_pending(self, window: SubscriptionWindow, when: Optional[datetime] = None) -> bool:
+        """
+        Registers a window whose subscription has not been created yet.
+        :param window:
+        :param when: when the subscription is due to be created, by default lead_time before the start of the window
+        :return: False if the window has been cancelled in the meantime
+        """
+        with self._lock:
+            if window.cancelled:
+                return False
+
+            when = when or window.start - self.lead_time
+            heapq.heappush(self._pending, (when, next(self._counter), window))
+            self._pending_count += 1
+            window.tracked = True
+
+        return True
+
+    def add_live(self, window: SubscriptionWindow, subscription_id: Any, when: Optional[datetime] = None) -> bool:
+        """
+        Registers a window whose subscription has been created.
+        :param window:
+        :param subscription_id:
+        :param when: when the subscription is due to be torn down, by default the end of the window
+        :return: False if the window has been cancelled in the meantime
+        """
+        with self._lock:
+            if window.cancelled:
+                return False
+
+            when = when or window.end
+            if when is not None:
+                heapq.heappush(self._live, (when, next(self._counter), window))
+            self._live_by_id[subscription_id] = window
+            window.tracked = True
+
+        return True
+
+    def get_live(self, subscription_id: Any) -> Optional[SubscriptionWindow]:
+        """
+        :param subscription_id:
+        :return: the tracked window of the subscription, if any
+        """
+        with self._lock:
+            return self._live_by_id.get(subscription_id)
+
+    def cancel(self, window: SubscriptionWindow) -> None:
+        with self._lock:
+            self._cancel(window)
+
+    def cancel_by_subscription_id(self, subscription_id: Any) -> None:
+        with self._lock:
+            window = self._live_by_id.get(subscription_id)
+            if window is not None:
+                self._cancel(window)
+
+    def _cancel(self, window: SubscriptionWindow) -> None:
+        if window.cancelled:
+            return
+
+        window.cancelled = True
+
+        if not window.tracked:
+            return
+
+        window.tracked = False
+
+        if window.subscription is None:
+            self._pending_count -= 1
+        else:
+            self._live_by_id.pop(window.subscription.id, None)
+
+    def pop_due(self, now: datetime, limit: Optional[int] = None) -> List[SubscriptionWindow]:
+        """
+        Removes and returns the pending windows whose subscription should be created by now. Those that fail to be
+        created should be registered again via add_pending.
+        :param now:
+        :param limit:
+        :return:
+        """
+        return self._pop(self._pending, now, limit, pending=True)
+
+    def pop_expired(self, now: datetime, limit: Optional[int] = None) -> List[SubscriptionWindow]:
+        """
+        Removes and returns the live windows that have ended by now. Those that fail to be torn down should be
+        registered again via add_live.
+        :param now:
+        :param limit:
+        :return:
+        """
+        return self._pop(self._live, now, limit, pending=False)
+
+    def _pop(self, heap, now, limit, pending) -> List[SubscriptionWindow]:
+        result = []
+
+        with self._lock:
+            while heap and (limit is None or len(result) < limit):
+                when, _, window = heap[0]
+
+                if window.cancelled:
+                    heapq.heappop(heap)
+                    continue
+
+                if when > now:
+                    break
+
+                heapq.heappop(heap)
+                window.tracked = False
+                if pending:
+                    self._pending_count -= 1
+                else:
+                    self._live_by_id.pop(window.subscription.id, None)
+                result.append(window)
+
+        return result
+
+    def stats(self, now: datetime) -> SubscriptionStats:
+        """
+        :param now:
+        :return: the number of pending windows along with the number of tracked subscriptions that are still live and
+                 the ones that have expired but have not been torn down yet.
+        """
+        with self._lock:
+            expired = sum(1 for window in self._live_by_id.values() if window.end is not None and window.end <= now)
+
+            return SubscriptionStats(pending=self._pending_count,
+                                     live=len(self._live_by_id) - expired,
+                                     expired=expired)
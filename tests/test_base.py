@@ -0,0 +1,348 @@
+"""
+Copyright 2020 EUROCONTROL
+==========================================
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+   disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided with the distribution.
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products
+   derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE
+USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+==========================================
+
+Editorial note: this license is an instance of the BSD license template as provided by the Open Source Initiative:
+http://opensource.org/licenses/BSD-3-Clause
+
+Details on EUROCONTROL: http://www.eurocontrol.int
+"""
+
+__author__ = "EUROCONTROL (SWIM)"
+
+import gc
+import threading
+import weakref
+from functools import partial
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+from proton.handlers import FlowController, IncomingMessageHandler
+
+from pubsub_facades.base import PubSubFacade, SubscriberFacade, ContainerLifecycleHandler
+from pubsub_facades.dedup import DeduplicatingConsumer, WindowedLRUDeduplicator
+from pubsub_facades.flow_control import CreditController, CreditFlowHandler
+from pubsub_facades.message_view import MessageView, MessageViewDeliveryHandler, VIEW
+
+
+class DummyFacade(PubSubFacade):
+
+    @PubSubFacade.require_running
+    def action(self):
+        return 'done'
+
+
+def _make_container(running=False):
+    container = Mock()
+    container.is_running = Mock(return_value=running)
+    container.handler.handlers = []
+
+    return container
+
+
+def test_pubsubfacade__lifecycle_handler_is_registered_in_container_handler():
+    container = _make_container()
+
+    facade = DummyFacade(container, Mock())
+
+    assert 1 == len(container.handler.handlers)
+    assert isinstance(container.handler.handlers[0], ContainerLifecycleHandler)
+    assert facade._container_running is False
+
+
+def test_pubsubfacade__container_without_child_handlers__state_is_not_tracked():
+    container = Mock()
+    container.is_running = Mock(return_value=False)
+
+    facade = DummyFacade(container, Mock())
+
+    assert facade._container_running is None
+
+    container.is_running.return_value = True
+    assert facade.is_running() is True
+    assert 'done' == facade.action()
+
+
+def test_pubsubfacade__require_running__uses_tracked_state():
+    container = _make_container()
+    facade = DummyFacade(container, Mock())
+    lifecycle_handler = container.handler.handlers[0]
+
+    with pytest.raises(RuntimeError) as e:
+        facade.action()
+    assert "Action cannot complete because container has not been started yet" == str(e.value)
+
+    lifecycle_handler.on_reactor_init(Mock())
+    container.is_running.reset_mock()
+
+    assert 'done' == facade.action()
+    assert facade.is_running() is True
+    container.is_running.assert_not_called()
+
+    lifecycle_handler.on_reactor_final(Mock())
+
+    with pytest.raises(RuntimeError):
+        facade.action()
+    assert facade.is_running() is False
+
+
+def test_pubsubfacade__container_already_running__is_queried_until_restarted():
+    container = _make_container(running=True)
+
+    facade = DummyFacade(container, Mock())
+
+    assert facade._container_running is None
+    assert 'done' == facade.action()
+
+    container.is_running.return_value = False
+    with pytest.raises(RuntimeError):
+        facade.action()
+
+
+def test_pubsubfacade__container_thread_dies_without_stop_event__is_not_considered_running():
+    container = _make_container()
+    facade = DummyFacade(container, Mock())
+    lifecycle_handler = container.handler.handlers[0]
+    started = threading.Event()
+
+    def reactor():
+        lifecycle_handler.on_reactor_init(Mock())
+        started.set()
+        raise ValueError("reactor crashed")
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(threading, 'excepthook', lambda args: None)
+        thread = threading.Thread(target=reactor)
+        thread.start()
+        thread.join()
+
+    assert started.is_set()
+    assert facade._container_running is False
+    with pytest.raises(RuntimeError):
+        facade.action()
+
+
+def test_pubsubfacade__previous_container_thread_ends_after_restart__is_still_considered_running():
+    container = _make_container()
+    facade = DummyFacade(container, Mock())
+    lifecycle_handler = container.handler.handlers[0]
+    started, restarted = threading.Event(), threading.Event()
+
+    def reactor():
+        lifecycle_handler.on_reactor_init(Mock())
+        started.set()
+        restarted.wait()
+
+    thread = threading.Thread(target=reactor)
+    thread.start()
+    started.wait()
+
+    lifecycle_handler.on_reactor_init(Mock())
+    restarted.set()
+    thread.join()
+
+    assert facade._container_running is True
+    assert 'done' == facade.action()
+
+
+def test_pubsubfacade__container_thread_alive__does_not_keep_the_facade_alive():
+    container = _make_container()
+    facade = DummyFacade(container, Mock())
+    lifecycle_handler = container.handler.handlers[0]
+    started, release = threading.Event(), threading.Event()
+
+    def reactor():
+        lifecycle_handler.on_reactor_init(Mock())
+        started.set()
+        release.wait()
+
+    thread = threading.Thread(target=reactor)
+    thread.start()
+    started.wait()
+
+    facade_ref = weakref.ref(facade)
+    del facade, container, lifecycle_handler
+    gc.collect()
+
+    try:
+        assert facade_ref() is None
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_pubsubfacade__run_not_threaded__state_is_reset_when_run_raises():
+    container = _make_container()
+    facade = DummyFacade(container, Mock())
+    lifecycle_handler = container.handler.handlers[0]
+
+    def run(threaded):
+        lifecycle_handler.on_reactor_init(Mock())
+        raise ValueError("reactor crashed")
+
+    container.run = Mock(side_effect=run)
+
+    with pytest.raises(ValueError):
+        facade.run()
+
+    assert facade._container_running is False
+
+
+def test_subscriberfacade__deduplication_is_opt_in():
+    facade = SubscriberFacade(_make_container(running=True), Mock())
+    message_consumer = Mock()
+
+    facade._attach_message_consumer(queue='queue', message_consumer=message_consumer)
+
+    facade.container.consumer.attach_message_consumer.assert_called_once_with(queue='queue',
+                                                                               message_consumer=message_consumer)
+    assert facade.deduplication_stats('queue') is None
+
+
+def test_subscriberfacade__deduplication_enabled__consumer_is_wrapped_per_queue():
+    facade = SubscriberFacade(_make_container(running=True), Mock())
+    facade.deduplicator_factory = WindowedLRUDeduplicator
+    message_consumer = Mock()
+
+    facade._attach_message_consumer(queue='queue1', message_consumer=message_consumer)
+    facade._attach_message_consumer(queue='queue2', message_consumer=message_consumer)
+
+    consumer1 = facade.container.consumer.attach_message_consumer.call_args_list[0].kwargs['message_consumer']
+    consumer2 = facade.container.consumer.attach_message_consumer.call_args_list[1].kwargs['message_consumer']
+    assert isinstance(consumer1, DeduplicatingConsumer)
+    assert consumer1.deduplicator is not consumer2.deduplicator
+
+    consumer1(Mock(id='id-1'))
+    consumer1(Mock(id='id-1'))
+    consumer2(Mock(id='id-1'))
+
+    assert 2 == message_consumer.call_count
+    assert (2, 1, 0.) == facade.deduplication_stats('queue1')
+    assert (1, 0, 0.) == facade.deduplication_stats('queue2')
+
+    facade._detach_message_consumer('queue1')
+    assert facade.deduplication_stats('queue1') is None
+
+
+class CreditSubscriberFacade(SubscriberFacade):
+    credit_controller_factory = partial(CreditController, min_credit=1, round_trip_time=0.1)
+
+
+def test_subscriberfacade__credit_autotuning_enabled__consumer_is_wrapped_and_reports_receiver_stats():
+    container = _make_container(running=True)
+    receiver = Mock(credit=5, queued=2)
+    receiver.source.address = 'queue'
+    container.consumer = Mock(spec=['attach_message_consumer', 'receivers'], receivers={receiver: Mock()})
+    facade = CreditSubscriberFacade(container, Mock())
+    facade.deduplicator_factory = WindowedLRUDeduplicator
+
+    facade._attach_message_consumer(queue='queue', message_consumer=Mock())
+    facade.message_consumers['queue'](Mock(id='id-1', body=b'1234'))
+
+    assert isinstance(facade.message_consumers['queue'], CreditController)
+    assert (5, 2, 8) == facade.credit_stats('queue')[:3]
+    assert (1, 0, 0.) == facade.deduplication_stats('queue')
+    receiver.flow.assert_called_once()
+
+
+def test_subscriberfacade__message_view_mode__consumer_receives_views_after_deduplication():
+    facade = SubscriberFacade(_make_container(running=True), Mock())
+    facade.message_view_mode = VIEW
+    facade.deduplicator_factory = WindowedLRUDeduplicator
+    message_consumer = Mock()
+    message = Mock(id='id-1')
+
+    facade._attach_message_consumer(queue='queue', message_consumer=message_consumer)
+    facade.message_consumers['queue'](message)
+    facade.message_consumers['queue'](message)
+
+    message_consumer.assert_called_once()
+    assert isinstance(message_consumer.call_args.args[0], MessageView)
+    assert (2, 1, 0.) == facade.deduplication_stats('queue')
+
+
+def test_subscriberfacade__credit_autotuning_enabled__replaces_the_refilling_flow_controller_upon_creation():
+    container = _make_container()
+    other_handler = Mock()
+    consumer_handler = SimpleNamespace(handlers=[FlowController(10), other_handler],
+                                       attach_message_consumer=Mock(),
+                                       receivers={})
+    container.consumer = consumer_handler
+
+    facade = CreditSubscriberFacade(container, Mock())
+
+    assert 2 == len(consumer_handler.handlers)
+    flow_handler, _ = consumer_handler.handlers
+    assert isinstance(flow_handler, CreditFlowHandler)
+    assert 10 == flow_handler.window
+
+    # the handlers are left untouched once the container runs
+    container.handler.handlers[0].on_reactor_init(Mock())
+    facade._attach_message_consumer(queue='queue', message_consumer=Mock())
+    facade._attach_message_consumer(queue='other', message_consumer=Mock())
+    assert [flow_handler, other_handler] == consumer_handler.handlers
+
+    # the proton FlowController would have refilled the slow consumer's receiver to 10 upon delivery
+    link = Mock(is_receiver=True, credit=0, queued=0)
+    link.source.address = 'queue'
+    link.flow.side_effect = lambda n: setattr(link, 'credit', link.credit + n)
+    consumer_handler.receivers[link] = Mock()
+
+    flow_handler.on_link_local_open(Mock(link=link))
+    assert 1 == link.credit
+
+    link.credit = 0
+    flow_handler.on_delivery(Mock(link=link))
+    assert 0 == link.credit
+
+
+def test_subscriberfacade__credit_autotuning_enabled__container_already_running__handlers_are_left_untouched():
+    container = _make_container(running=True)
+    flow_controller = FlowController(10)
+    container.consumer = SimpleNamespace(handlers=[flow_controller], attach_message_consumer=Mock(), receivers={})
+
+    facade = CreditSubscriberFacade(container, Mock())
+
+    assert [flow_controller] == container.consumer.handlers
+    assert facade._credit_flow_handler is None
+
+
+def test_subscriberfacade__message_view_mode__replaces_the_incoming_message_handler_upon_creation():
+    class ViewSubscriberFacade(SubscriberFacade):
+        message_view_mode = VIEW
+
+    container = _make_container()
+    incoming_message_handler = IncomingMessageHandler()
+    other_handler = Mock()
+    container.consumer = SimpleNamespace(handlers=[other_handler, incoming_message_handler],
+                                         attach_message_consumer=Mock())
+
+    facade = ViewSubscriberFacade(container, Mock())
+    facade._attach_message_consumer(queue='queue', message_consumer=Mock())
+
+    _, view_handler = container.consumer.handlers
+    assert isinstance(view_handler, MessageViewDeliveryHandler)
+    assert view_handler.incoming_message_handler is incoming_message_handler
+    assert view_handler.is_view_queue('queue') is True
+    assert view_handler.is_view_queue('other') is False
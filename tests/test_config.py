@@ -0,0 +1,249 @@
+"""
+Copyright 2020 EUROCONTROL
+==========================================
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+   disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided with the distribution.
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products
+   derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE
+USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+==========================================
+
+Editorial note: this license is an instance of the BSD license template as provided by the Open Source Initiative:
+http://opensource.org/licenses/BSD-3-Clause
+
+Details on EUROCONTROL: http://www.eurocontrol.int
+"""
+
+__author__ = "EUROCONTROL (SWIM)"
+
+import json
+import os
+import time
+
+import pytest
+
+from pubsub_facades import config as config_module
+from pubsub_facades.base import yaml_file_to_dict
+from pubsub_facades.config import load_config, parse_config_file, env_to_config_overlay, merge_configs, \
+    validate_config, FacadeConfig, thaw
+
+CONFIG = {
+    'BROKER': {
+        'host': '0.0.0.0:5671',
+        'cert_db': '/secrets/ca_certificate.pem',
+    },
+    'SUBSCRIPTION-MANAGER-API': {
+        'host': 'localhost:8080',
+        'https': False,
+        'timeout': 30,
+        'verify': False,
+        'username': 'username',
+        'password': 'password',
+    },
+    'LOGGING': {
+        'version': 1,
+        'root': {'level': 'DEBUG', 'handlers': []},
+    }
+}
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    config_module.clear_cache()
+    yield
+    config_module.clear_cache()
+
+
+@pytest.fixture
+def yml_file(tmp_path):
+    import yaml
+
+    path = tmp_path / 'config.yml'
+    path.write_text(yaml.dump(CONFIG))
+
+    return str(path)
+
+
+def test_parse_config_file__invalid_extension__raises_valueerror(tmp_path):
+    path = tmp_path / 'config.txt'
+    path.write_text('')
+
+    with pytest.raises(ValueError):
+        parse_config_file(str(path))
+
+
+@pytest.mark.parametrize('filename, dump', [
+    ('config.yml', None),
+    ('config.yaml', None),
+    ('config.json', json.dumps),
+])
+def test_parse_config_file__yaml_and_json_are_supported(tmp_path, filename, dump):
+    import yaml
+
+    path = tmp_path / filename
+    path.write_text((dump or yaml.dump)(CONFIG))
+
+    assert CONFIG == thaw(parse_config_file(str(path)))
+
+
+def test_parse_config_file__result_is_frozen(yml_file):
+    config = parse_config_file(yml_file)
+
+    with pytest.raises(TypeError):
+        config['BROKER']['host'] = 'other'
+    assert isinstance(config['LOGGING']['root']['handlers'], tuple)
+
+
+def test_yaml_file_to_dict__returns_a_mutable_copy(tmp_path, yml_file):
+    config = yaml_file_to_dict(yml_file)
+    config['BROKER']['host'] = 'other'
+
+    assert CONFIG == thaw(parse_config_file(yml_file))
+
+    path = tmp_path / 'config.yaml'
+    path.write_text('')
+    assert yaml_file_to_dict(str(path)) is None
+
+
+def test_parse_config_file__is_memoized_until_file_changes(yml_file):
+    first = parse_config_file(yml_file)
+    assert first is parse_config_file(yml_file)
+
+    with open(yml_file, 'a') as f:
+        f.write('EXTRA: 1\n')
+    os.utime(yml_file, ns=(time.time_ns(), time.time_ns() + 1_000_000_000))
+
+    second = parse_config_file(yml_file)
+    assert second is not first
+    assert 1 == second['EXTRA']
+
+
+def test_merge_configs__merges_nested_dicts_without_mutating_the_inputs():
+    base = {'A': {'x': 1, 'y': 2}, 'B': [1]}
+    overlay = {'A': {'y': 3}, 'B': [2]}
+
+    assert {'A': {'x': 1, 'y': 3}, 'B': [2]} == merge_configs(base, overlay)
+    assert {'A': {'x': 1, 'y': 2}, 'B': [1]} == base
+
+
+def test_env_to_config_overlay__matches_existing_keys_and_parses_values():
+    environ = {
+        'PUBSUB__SUBSCRIPTION_MANAGER_API__TIMEOUT': '60',
+        'PUBSUB__SUBSCRIPTION_MANAGER_API__HOST': 'sm:8080',
+        'PUBSUB__BROKER__CERT_DB': '/other/ca.pem',
+        'OTHER__BROKER__HOST': 'ignored',
+    }
+
+    overlay = env_to_config_overlay('PUBSUB', environ=environ, base=CONFIG)
+
+    assert {
+        'SUBSCRIPTION-MANAGER-API': {'timeout': 60, 'host': 'sm:8080'},
+        'BROKER': {'cert_db': '/other/ca.pem'},
+    } == overlay
+
+
+def test_env_to_config_overlay__missing_section__is_mapped_to_the_known_section_name():
+    environ = {
+        'PUBSUB__SUBSCRIPTION_MANAGER_API__TIMEOUT': '60',
+        'PUBSUB__OTHER_SECTION__KEY': 'value',
+    }
+
+    overlay = env_to_config_overlay('PUBSUB', environ=environ, base={})
+
+    assert {'SUBSCRIPTION-MANAGER-API': {'timeout': 60}, 'OTHER_SECTION': {'key': 'value'}} == overlay
+
+
+def test_env_to_config_overlay__string_values__are_not_parsed_as_json():
+    environ = {
+        'PUBSUB__SUBSCRIPTION_MANAGER_API__PASSWORD': '123456',
+        'PUBSUB__SUBSCRIPTION_MANAGER_API__USERNAME': 'null',
+        'PUBSUB__SUBSCRIPTION_MANAGER_API__VERIFY': 'true',
+        'PUBSUB__BROKER__PORT': '5671',
+    }
+
+    overlay = env_to_config_overlay('PUBSUB', environ=environ, base=CONFIG)
+
+    assert {
+        'SUBSCRIPTION-MANAGER-API': {'password': '123456', 'username': 'null', 'verify': True},
+        'BROKER': {'port': '5671'},
+    } == overlay
+
+
+def test_env_to_config_overlay__missing_section__only_known_non_string_keys_are_parsed_as_json():
+    environ = {
+        'PUBSUB__SUBSCRIPTION_MANAGER_API__HTTPS': 'true',
+        'PUBSUB__SUBSCRIPTION_MANAGER_API__PASSWORD': '123456',
+    }
+
+    overlay = env_to_config_overlay('PUBSUB', environ=environ, base={})
+
+    assert {'SUBSCRIPTION-MANAGER-API': {'https': True, 'password': '123456'}} == overlay
+
+
+@pytest.mark.parametrize('section, key', [
+    ('BROKER', None),
+    ('BROKER', 'host'),
+    ('SUBSCRIPTION-MANAGER-API', None),
+    ('SUBSCRIPTION-MANAGER-API', 'username'),
+])
+def test_validate_config__missing_values__raises_valueerror(section, key):
+    config = thaw(CONFIG)
+    if key is None:
+        del config[section]
+    else:
+        del config[section][key]
+
+    with pytest.raises(ValueError):
+        validate_config(config)
+
+
+def test_validate_config__result_is_immutable():
+    config = validate_config(CONFIG)
+
+    assert isinstance(config, FacadeConfig)
+    assert 'localhost:8080' == config.subscription_manager_api.host
+    with pytest.raises(TypeError):
+        config.broker['host'] = 'other'
+    with pytest.raises(AttributeError):
+        config.subscription_manager_api.host = 'other'
+
+
+def test_load_config__overlays_are_applied_in_order(yml_file, monkeypatch):
+    monkeypatch.setenv('PUBSUB__BROKER__HOST', 'env:5671')
+
+    config = load_config(yml_file,
+                         overlays=[{'SUBSCRIPTION-MANAGER-API': {'timeout': 10}},
+                                   '{"SUBSCRIPTION-MANAGER-API": {"https": true}, "BROKER": {"host": "json:5671"}}'],
+                         env_prefix='PUBSUB')
+
+    assert 10 == config.subscription_manager_api.timeout
+    assert config.subscription_manager_api.https is True
+    assert 'env:5671' == config.broker['host']
+    assert CONFIG['BROKER']['host'] == parse_config_file(yml_file)['BROKER']['host']
+
+
+def test_load_config__is_memoized_per_sources(yml_file, monkeypatch):
+    first = load_config(yml_file, overlays=[{'BROKER': {'host': 'overlay:5671'}}], env_prefix='PUBSUB')
+
+    assert first is load_config(yml_file, overlays=[{'BROKER': {'host': 'overlay:5671'}}], env_prefix='PUBSUB')
+    assert first is not load_config(yml_file, env_prefix='PUBSUB')
+
+    monkeypatch.setenv('PUBSUB__BROKER__HOST', 'env:5671')
+    second = load_config(yml_file, overlays=[{'BROKER': {'host': 'overlay:5671'}}], env_prefix='PUBSUB')
+
+    assert second is not first
+    assert 'env:5671' == second.broker['host']
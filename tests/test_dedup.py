@@ -0,0 +1,131 @@
+"""
+Copyright 2020 EUROCONTROL
+==========================================
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+   disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided with the distribution.
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products
+   derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE
+USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+==========================================
+
+Editorial note: this license is an instance of the BSD license template as provided by the Open Source Initiative:
+http://opensource.org/licenses/BSD-3-Clause
+
+Details on EUROCONTROL: http://www.eurocontrol.int
+"""
+
+__author__ = "EUROCONTROL (SWIM)"
+
+from unittest.mock import Mock, patch
+
+import pytest
+
+from pubsub_facades.dedup import message_key, WindowedLRUDeduplicator, RotatingBloomDeduplicator, \
+    DeduplicatingConsumer, DeduplicationStats
+
+
+def test_message_key__uses_message_id_when_available():
+    assert 'id-1' == message_key(Mock(id='id-1', body='body'))
+
+
+@pytest.mark.parametrize('body', ['body', b'body', memoryview(b'body')])
+def test_message_key__no_id__hashes_the_body(body):
+    assert message_key(Mock(id=None, body='body')) == message_key(Mock(id=None, body=body))
+    assert message_key(Mock(id=None, body='body')) != message_key(Mock(id=None, body='other'))
+
+
+def _seen(deduplicator, key):
+    result = deduplicator.contains(key)
+    deduplicator.add(key)
+
+    return result
+
+
+def test_windowed_lru_deduplicator__bounded_by_size():
+    deduplicator = WindowedLRUDeduplicator(max_size=2, window=None)
+
+    assert _seen(deduplicator, 'a') is False
+    assert _seen(deduplicator, 'b') is False
+    assert _seen(deduplicator, 'a') is True
+    assert _seen(deduplicator, 'c') is False
+
+    assert 2 == len(deduplicator)
+    assert _seen(deduplicator, 'b') is False
+    assert 0. == deduplicator.false_positive_rate
+
+
+def test_windowed_lru_deduplicator__keys_expire_after_window():
+    deduplicator = WindowedLRUDeduplicator(window=10)
+
+    with patch('pubsub_facades.dedup.time.monotonic', return_value=100.):
+        assert _seen(deduplicator, 'a') is False
+    with patch('pubsub_facades.dedup.time.monotonic', return_value=105.):
+        assert _seen(deduplicator, 'a') is True
+    with patch('pubsub_facades.dedup.time.monotonic', return_value=116.):
+        assert _seen(deduplicator, 'a') is False
+
+
+def test_rotating_bloom_deduplicator__invalid_parameters__raises_valueerror():
+    with pytest.raises(ValueError):
+        RotatingBloomDeduplicator(capacity=0)
+    with pytest.raises(ValueError):
+        RotatingBloomDeduplicator(error_rate=1)
+
+
+def test_rotating_bloom_deduplicator__remembers_keys_for_at_least_one_generation():
+    deduplicator = RotatingBloomDeduplicator(capacity=1000, error_rate=0.01)
+
+    assert 0. == deduplicator.false_positive_rate
+    assert sum(_seen(deduplicator, i) for i in range(1000)) < 20
+    assert all(_seen(deduplicator, i) for i in range(1000))
+
+    false_positives = sum(_seen(deduplicator, i) for i in range(1000, 2000))
+    assert false_positives < 50
+    assert 0 < deduplicator.false_positive_rate < 0.05
+
+    # keys of two generations ago are forgotten
+    for i in range(2000, 4000):
+        _seen(deduplicator, i)
+    assert sum(_seen(deduplicator, i) for i in range(1000)) < 50
+
+
+def test_deduplicating_consumer__drops_duplicates_and_counts_them():
+    message_consumer = Mock(return_value='result')
+    consumer = DeduplicatingConsumer(message_consumer, WindowedLRUDeduplicator())
+    message = Mock(id='id-1')
+
+    assert 'result' == consumer(message)
+    assert consumer(message) is None
+    assert 'result' == consumer(Mock(id='id-2'))
+
+    assert 2 == message_consumer.call_count
+    assert DeduplicationStats(received=3, duplicates_dropped=1, false_positive_rate=0.) == consumer.stats
+
+
+@pytest.mark.parametrize('deduplicator', [WindowedLRUDeduplicator(), RotatingBloomDeduplicator(capacity=1000)])
+def test_deduplicating_consumer__consumer_raises__redelivery_is_consumed(deduplicator):
+    message_consumer = Mock(side_effect=[ValueError('failed'), 'result'])
+    consumer = DeduplicatingConsumer(message_consumer, deduplicator)
+    message = Mock(id='id-1')
+
+    with pytest.raises(ValueError):
+        consumer(message)
+
+    assert 'result' == consumer(message)
+    assert consumer(message) is None
+    assert 2 == message_consumer.call_count
+    assert (3, 1) == consumer.stats[:2]
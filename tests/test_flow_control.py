@@ -0,0 +1,173 @@
+"""
+Copyright 2020 EUROCONTROL
+==========================================
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+   disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided with the distribution.
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products
+   derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE
+USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+==========================================
+
+Editorial note: this license is an instance of the BSD license template as provided by the Open Source Initiative:
+http://opensource.org/licenses/BSD-3-Clause
+
+Details on EUROCONTROL: http://www.eurocontrol.int
+"""
+
+__author__ = "EUROCONTROL (SWIM)"
+
+from unittest.mock import Mock, patch
+
+import pytest
+
+from pubsub_facades.flow_control import CreditController, CreditFlowHandler, CreditStats, message_size
+from pubsub_facades.message_view import MessageView
+
+
+class FakeReceiver:
+
+    def __init__(self, credit=0, queued=0):
+        self.credit = credit
+        self.queued = queued
+
+    def flow(self, n):
+        self.credit += n
+
+
+def _consume(controller, latency, message=None):
+    with patch('pubsub_facades.flow_control.time.perf_counter', side_effect=[0., latency]):
+        return controller(message or Mock(body=b''))
+
+
+@pytest.mark.parametrize('body, expected', [
+    (b'12345', 5),
+    (memoryview(b'123'), 3),
+    ('12', 2),
+    ({'a': 1}, None),
+])
+def test_message_size(body, expected):
+    assert expected == message_size(Mock(body=body))
+
+
+def test_message_size__view_of_the_encoded_message__is_the_encoded_size_without_decoding():
+    view = MessageView(encoded=b'\x00' * 10)
+
+    assert 10 == message_size(view)
+    assert view._message is None
+
+
+def test_credit_controller__invalid_bounds__raises_valueerror():
+    with pytest.raises(ValueError):
+        CreditController(Mock(), Mock(), min_credit=0)
+    with pytest.raises(ValueError):
+        CreditController(Mock(), Mock(), min_credit=10, max_credit=5)
+
+
+def test_credit_controller__calls_the_consumer():
+    message_consumer = Mock(return_value='result')
+    controller = CreditController(message_consumer, lambda: FakeReceiver())
+    message = Mock(body=b'')
+
+    assert 'result' == _consume(controller, 0.001, message)
+    message_consumer.assert_called_once_with(message)
+
+
+def test_credit_controller__fast_consumer__credit_grows_up_to_max_credit():
+    receiver = FakeReceiver()
+    controller = CreditController(Mock(), lambda: receiver, max_credit=200, round_trip_time=0.1)
+
+    _consume(controller, 0.001)
+    assert 100 == receiver.credit
+
+    for _ in range(50):
+        _consume(controller, 0.0001)
+    assert 200 == receiver.credit
+
+
+def test_credit_controller__slow_consumer__credit_is_not_topped_up_beyond_min_credit():
+    receiver = FakeReceiver(credit=0)
+    controller = CreditController(Mock(), lambda: receiver, min_credit=2, round_trip_time=0.1)
+
+    _consume(controller, 1.)
+    assert 2 == controller.target_credit
+    assert 2 == receiver.credit
+
+
+def test_credit_controller__credit_is_bounded_by_buffered_bytes():
+    receiver = FakeReceiver(queued=4)
+    controller = CreditController(Mock(), lambda: receiver, max_buffered_bytes=10_000, round_trip_time=1.)
+
+    _consume(controller, 0.001, Mock(body=b'x' * 1000))
+
+    assert 6 == controller.target_credit
+    assert CreditStats(credit=6, buffered_messages=4, buffered_bytes=4000, consume_latency=0.001) == controller.stats
+
+
+def test_credit_controller__receiver_not_found__consumer_still_called():
+    message_consumer = Mock()
+    controller = CreditController(message_consumer, lambda: None)
+
+    _consume(controller, 0.001)
+
+    message_consumer.assert_called_once()
+    assert CreditStats(credit=None, buffered_messages=None, buffered_bytes=None, consume_latency=0.001) == \
+        controller.stats
+
+
+class FakeLink(FakeReceiver):
+
+    def __init__(self, address, credit=0):
+        super().__init__(credit=credit)
+        self.is_receiver = True
+        self.source = Mock(address=address)
+
+    def deliver(self):
+        self.credit -= 1
+        self.queued += 1
+
+    def drained(self):
+        return 0
+
+
+def test_credit_flow_handler__controlled_receiver__is_not_refilled_upon_delivery():
+    controller = CreditController(Mock(), lambda: None, min_credit=1, round_trip_time=0.1)
+    handler = CreditFlowHandler(lambda queue: controller if queue == 'queue' else None, window=10)
+    link = FakeLink('queue')
+
+    handler.on_link_local_open(Mock(link=link))
+    assert 1 == link.credit
+
+    link.deliver()
+    handler.on_delivery(Mock(link=link))
+    assert 0 == link.credit
+
+    # a slow consumer gets its credit back one message at a time
+    link.queued -= 1
+    _consume(controller, 1.)
+    assert 1 == link.credit
+
+
+def test_credit_flow_handler__uncontrolled_receiver__is_refilled_to_the_window():
+    handler = CreditFlowHandler(lambda queue: None, window=10)
+    link = FakeLink('other')
+
+    handler.on_link_remote_open(Mock(link=link))
+    assert 10 == link.credit
+
+    link.deliver()
+    handler.on_delivery(Mock(link=link))
+    assert 10 == link.credit
@@ -30,11 +30,14 @@ Details on EUROCONTROL: http://www.eurocontrol.int
 
 __author__ = "EUROCONTROL (SWIM)"
 
-from unittest.mock import Mock
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock, call
 
 import pytest
 
-from pubsub_facades.geofencing_pubsub import GeofencingSubscriber
+from rest_client.errors import APIError
+
+from pubsub_facades.geofencing_pubsub import GeofencingSubscriber, Subscription
 
 
 def test_geofencingsubscriber__subscribe_requires_running():
@@ -79,3 +82,236 @@ def test_geofencingsubscriber__unsubscribe_requires_running():
     with pytest.raises(RuntimeError) as e:
         geofencing_subscriber.unsubscribe(Mock())
     assert "Action cannot complete because container has not been started yet" == str(e.value)
+
+
+def _make_running_subscriber():
+    container = Mock()
+    container.is_running = Mock(return_value=True)
+    gs_client = Mock()
+    replies = iter(range(1, 100))
+
+    def post_subscription(uas_zones_filter):
+        subscription_id = next(replies)
+        return Mock(subscription_id=subscription_id, publication_location=f'queue-{subscription_id}')
+
+    gs_client.post_subscription = Mock(side_effect=post_subscription)
+
+    return GeofencingSubscriber(container, gs_client)
+
+
+def _uas_zones_filter(start, end):
+    return {'startDateTime': start.isoformat(), 'endDateTime': end.isoformat()}
+
+
+NOW = datetime(2020, 1, 1, 12, tzinfo=timezone.utc)
+
+
+def test_geofencingsubscriber__subscribe__subscription_is_tracked_as_live():
+    geofencing_subscriber = _make_running_subscriber()
+
+    subscription = geofencing_subscriber.subscribe(_uas_zones_filter(NOW - timedelta(hours=1),
+                                                                      NOW + timedelta(hours=1)),
+                                                   message_consumer=Mock())
+
+    assert Subscription(id=1, queue='queue-1') == subscription
+    assert (0, 1, 0) == geofencing_subscriber.subscription_stats(NOW)
+    assert (0, 0, 1) == geofencing_subscriber.subscription_stats(NOW + timedelta(hours=2))
+
+
+def test_geofencingsubscriber__schedule_subscription__is_created_shortly_before_start():
+    geofencing_subscriber = _make_running_subscriber()
+    start = datetime.now(timezone.utc) + timedelta(hours=1)
+
+    window = geofencing_subscriber.schedule_subscription(_uas_zones_filter(start, start + timedelta(hours=1)),
+                                                         message_consumer=Mock())
+
+    assert window.subscription is None
+    assert (1, 0, 0) == geofencing_subscriber.subscription_stats()
+    geofencing_subscriber.gs_client.post_subscription.assert_not_called()
+
+    geofencing_subscriber.process_subscription_windows(now=start - timedelta(minutes=5))
+    assert window.subscription is None
+
+    geofencing_subscriber.process_subscription_windows(now=start - geofencing_subscriber.activation_lead_time)
+    assert Subscription(id=1, queue='queue-1') == window.subscription
+    geofencing_subscriber.container.consumer.attach_message_consumer.assert_called_once_with(
+        queue='queue-1', message_consumer=window.message_consumer)
+    assert (0, 1, 0) == geofencing_subscriber.subscription_stats(start)
+
+
+def test_geofencingsubscriber__schedule_subscription__already_due__is_created_right_away():
+    geofencing_subscriber = _make_running_subscriber()
+    now = datetime.now(timezone.utc)
+
+    window = geofencing_subscriber.schedule_subscription(_uas_zones_filter(now, now + timedelta(hours=1)),
+                                                         message_consumer=Mock())
+
+    assert Subscription(id=1, queue='queue-1') == window.subscription
+
+
+def test_geofencingsubscriber__process_subscription_windows__tears_down_expired_in_batches():
+    geofencing_subscriber = _make_running_subscriber()
+    geofencing_subscriber.expiry_batch_size = 2
+
+    for hours in range(1, 5):
+        geofencing_subscriber.subscribe(_uas_zones_filter(NOW - timedelta(hours=1), NOW + timedelta(hours=hours)),
+                                        message_consumer=Mock())
+
+    later = NOW + timedelta(hours=3)
+    assert (0, 1, 3) == geofencing_subscriber.subscription_stats(later)
+
+    geofencing_subscriber.process_subscription_windows(now=later)
+    assert (0, 1, 1) == geofencing_subscriber.subscription_stats(later)
+    assert [call(1), call(2)] == geofencing_subscriber.gs_client.delete_subscription_by_id.call_args_list
+    assert [call(queue='queue-1'), call(queue='queue-2')] == \
+        geofencing_subscriber.container.consumer.detach_message_consumer.call_args_list
+    geofencing_subscriber.gs_client.get_subscription_by_id.assert_not_called()
+
+    geofencing_subscriber.process_subscription_windows(now=later)
+    assert (0, 1, 0) == geofencing_subscriber.subscription_stats(later)
+
+
+def test_geofencingsubscriber__unsubscribe__stops_tracking_the_subscription():
+    geofencing_subscriber = _make_running_subscriber()
+    subscription = geofencing_subscriber.subscribe(_uas_zones_filter(NOW, NOW + timedelta(hours=1)),
+                                                   message_consumer=Mock())
+
+    geofencing_subscriber.unsubscribe(subscription.id)
+
+    assert (0, 0, 0) == geofencing_subscriber.subscription_stats(NOW + timedelta(hours=2))
+    geofencing_subscriber.process_subscription_windows(now=NOW + timedelta(hours=2))
+    geofencing_subscriber.gs_client.delete_subscription_by_id.assert_called_once_with(subscription.id)
+
+
+def test_geofencingsubscriber__cancel_subscription_window__pending_window_is_dropped():
+    geofencing_subscriber = _make_running_subscriber()
+    start = datetime.now(timezone.utc) + timedelta(hours=1)
+    window = geofencing_subscriber.schedule_subscription(_uas_zones_filter(start, start + timedelta(hours=1)),
+                                                         message_consumer=Mock())
+
+    geofencing_subscriber.cancel_subscription_window(window)
+
+    assert (0, 0, 0) == geofencing_subscriber.subscription_stats()
+    geofencing_subscriber.process_subscription_windows(now=start)
+    geofencing_subscriber.gs_client.post_subscription.assert_not_called()
+
+
+def test_geofencingsubscriber__process_subscription_windows__failed_teardown_is_retried_after_retry_delay():
+    geofencing_subscriber = _make_running_subscriber()
+    geofencing_subscriber.expiry_batch_size = 1
+    for hours in (1, 2):
+        geofencing_subscriber.subscribe(_uas_zones_filter(NOW - timedelta(hours=1), NOW + timedelta(hours=hours)),
+                                        message_consumer=Mock())
+    geofencing_subscriber.gs_client.delete_subscription_by_id.side_effect = [Exception('unavailable'), None, None]
+    later = NOW + timedelta(hours=3)
+
+    geofencing_subscriber.process_subscription_windows(now=later)
+    assert (0, 0, 2) == geofencing_subscriber.subscription_stats(later)
+
+    # the one that failed is retried after the ones that were already due
+    geofencing_subscriber.process_subscription_windows(now=later)
+    geofencing_subscriber.process_subscription_windows(now=later)
+    assert (0, 0, 1) == geofencing_subscriber.subscription_stats(later)
+
+    geofencing_subscriber.process_subscription_windows(now=later + geofencing_subscriber.retry_delay)
+
+    assert (0, 0, 0) == geofencing_subscriber.subscription_stats(later)
+    assert [call(1), call(2), call(1)] == geofencing_subscriber.gs_client.delete_subscription_by_id.call_args_list
+    assert [call(queue='queue-1'), call(queue='queue-2')] == \
+        geofencing_subscriber.container.consumer.detach_message_consumer.call_args_list
+
+
+def test_geofencingsubscriber__process_subscription_windows__failed_creation_is_retried_after_retry_delay():
+    geofencing_subscriber = _make_running_subscriber()
+    start = datetime.now(timezone.utc) + timedelta(hours=1)
+    window = geofencing_subscriber.schedule_subscription(_uas_zones_filter(start, start + timedelta(hours=1)),
+                                                         message_consumer=Mock())
+    post_subscription = geofencing_subscriber.gs_client.post_subscription.side_effect
+    geofencing_subscriber.gs_client.post_subscription.side_effect = [Exception('unavailable')]
+
+    geofencing_subscriber.process_subscription_windows(now=start)
+    assert window.subscription is None
+    assert (1, 0, 0) == geofencing_subscriber.subscription_stats(start)
+
+    geofencing_subscriber.gs_client.post_subscription.side_effect = post_subscription
+    geofencing_subscriber.process_subscription_windows(now=start)
+    assert window.subscription is None
+
+    geofencing_subscriber.process_subscription_windows(now=start + geofencing_subscriber.retry_delay)
+    assert window.subscription is not None
+    assert (0, 1, 0) == geofencing_subscriber.subscription_stats(start)
+
+
+def test_geofencingsubscriber__process_subscription_windows__subscription_already_deleted__teardown_is_done():
+    geofencing_subscriber = _make_running_subscriber()
+    geofencing_subscriber.subscribe(_uas_zones_filter(NOW - timedelta(hours=1), NOW + timedelta(hours=1)),
+                                    message_consumer=Mock())
+    geofencing_subscriber.gs_client.delete_subscription_by_id.side_effect = APIError('not found', status_code=404)
+    later = NOW + timedelta(hours=2)
+
+    geofencing_subscriber.process_subscription_windows(now=later)
+
+    assert (0, 0, 0) == geofencing_subscriber.subscription_stats(later)
+    geofencing_subscriber.container.consumer.detach_message_consumer.assert_called_once_with(queue='queue-1')
+
+
+def test_geofencingsubscriber__process_subscription_windows__failing_teardown__backs_off_and_gives_up():
+    geofencing_subscriber = _make_running_subscriber()
+    geofencing_subscriber.max_retries = 2
+    geofencing_subscriber.subscribe(_uas_zones_filter(NOW - timedelta(hours=1), NOW + timedelta(hours=1)),
+                                    message_consumer=Mock())
+    delete_subscription_by_id = geofencing_subscriber.gs_client.delete_subscription_by_id
+    delete_subscription_by_id.side_effect = APIError('unavailable', status_code=503)
+    retry_delay = geofencing_subscriber.retry_delay
+    later = NOW + timedelta(hours=2)
+
+    for now in (later, later + retry_delay, later + 2 * retry_delay):
+        geofencing_subscriber.process_subscription_windows(now=now)
+
+    # retried after retry_delay, then after twice as long
+    assert 2 == delete_subscription_by_id.call_count
+    assert (0, 0, 1) == geofencing_subscriber.subscription_stats(later)
+
+    geofencing_subscriber.process_subscription_windows(now=later + 3 * retry_delay)
+
+    assert 3 == delete_subscription_by_id.call_count
+    assert (0, 0, 0) == geofencing_subscriber.subscription_stats(later)
+
+
+def test_geofencingsubscriber__unsubscribe__fails__subscription_is_still_tracked():
+    geofencing_subscriber = _make_running_subscriber()
+    subscription = geofencing_subscriber.subscribe(_uas_zones_filter(NOW, NOW + timedelta(hours=1)),
+                                                   message_consumer=Mock())
+    geofencing_subscriber.gs_client.get_subscription_by_id.return_value = Mock(
+        subscription=Mock(publication_location=subscription.queue))
+    geofencing_subscriber.gs_client.delete_subscription_by_id.side_effect = [Exception('unavailable'), None]
+
+    with pytest.raises(Exception):
+        geofencing_subscriber.unsubscribe(subscription.id)
+
+    later = NOW + timedelta(hours=2)
+    assert (0, 0, 1) == geofencing_subscriber.subscription_stats(later)
+
+    geofencing_subscriber.process_subscription_windows(now=later)
+
+    assert (0, 0, 0) == geofencing_subscriber.subscription_stats(later)
+    geofencing_subscriber.container.consumer.detach_message_consumer.assert_called_once_with(queue='queue-1')
+
+
+def test_geofencingsubscriber__cancel_subscription_window__while_being_created__is_unsubscribed():
+    geofencing_subscriber = _make_running_subscriber()
+    start = datetime.now(timezone.utc) + timedelta(hours=1)
+    window = geofencing_subscriber.schedule_subscription(_uas_zones_filter(start, start + timedelta(hours=1)),
+                                                         message_consumer=Mock())
+    post_subscription = geofencing_subscriber.gs_client.post_subscription.side_effect
+
+    def post_and_cancel(uas_zones_filter):
+        geofencing_subscriber.cancel_subscription_window(window)
+        return post_subscription(uas_zones_filter)
+
+    geofencing_subscriber.gs_client.post_subscription.side_effect = post_and_cancel
+
+    geofencing_subscriber.process_subscription_windows(now=start)
+
+    assert (0, 0, 0) == geofencing_subscriber.subscription_stats(start)
+    geofencing_subscriber.gs_client.delete_subscription_by_id.assert_called_once_with(window.subscription.id)
@@ -0,0 +1,69 @@
+"""
+Copyright 2020 EUROCONTROL
+==========================================
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+   disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided with the distribution.
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products
+   derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE
+USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+==========================================
+
+Editorial note: this license is an instance of the BSD license template as provided by the Open Source Initiative:
+http://opensource.org/licenses/BSD-3-Clause
+
+Details on EUROCONTROL: http://www.eurocontrol.int
+"""
+
+__author__ = "EUROCONTROL (SWIM)"
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = [
+    'yaml',
+    'proton',
+    'swim_proton',
+    'rest_client',
+    'subscription_manager_client',
+    'geofencing_service_client',
+]
+
+
+def _modules_loaded_by_import(module_name: str):
+    code = (
+        "import json, sys\n"
+        f"import {module_name}\n"
+        "print(json.dumps(sorted(sys.modules)))\n"
+    )
+    output = subprocess.check_output([sys.executable, '-c', code])
+
+    return json.loads(output)
+
+
+@pytest.mark.parametrize('module_name', [
+    'pubsub_facades.base',
+    'pubsub_facades.swim_pubsub',
+    'pubsub_facades.geofencing_pubsub',
+])
+def test_facade_import__does_not_load_heavy_dependencies(module_name):
+    loaded = {module.split('.')[0] for module in _modules_loaded_by_import(module_name)}
+
+    assert [] == [module for module in HEAVY_MODULES if module in loaded]
+
@@ -0,0 +1,216 @@
+"""
+Copyright 2020 EUROCONTROL
+==========================================
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+   disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided with the distribution.
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products
+   derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE
+USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+==========================================
+
+Editorial note: this license is an instance of the BSD license template as provided by the Open Source Initiative:
+http://opensource.org/licenses/BSD-3-Clause
+
+Details on EUROCONTROL: http://www.eurocontrol.int
+"""
+
+__author__ = "EUROCONTROL (SWIM)"
+
+import json
+from unittest.mock import Mock, PropertyMock
+
+import proton
+import pytest
+
+from proton import Delivery
+from proton.handlers import IncomingMessageHandler, Reject
+
+from pubsub_facades.message_view import MessageView, MessageViewConsumer, MessageViewDeliveryHandler, VIEW, \
+    PASS_THROUGH, body_to_memoryview
+
+
+@pytest.mark.parametrize('body, expected', [
+    (b'bytes', b'bytes'),
+    (bytearray(b'bytearray'), b'bytearray'),
+    (memoryview(b'memoryview'), b'memoryview'),
+    ('text', b'text'),
+    ({'a': 1}, None),
+])
+def test_body_to_memoryview(body, expected):
+    result = body_to_memoryview(body)
+
+    assert expected == (result.tobytes() if result is not None else None)
+
+
+def test_body_to_memoryview__binary_body_is_not_copied():
+    body = bytearray(b'body')
+
+    body_to_memoryview(body)[0] = ord('B')
+
+    assert bytearray(b'Body') == body
+
+
+def test_message_view__no_message__raises_valueerror():
+    with pytest.raises(ValueError):
+        MessageView()
+
+
+def test_message_view__properties_do_not_touch_the_body():
+    message = Mock(id='id', subject='subject', content_type='application/json', properties={'key': 'value'})
+    type(message).body = PropertyMock(side_effect=AssertionError("body accessed"))
+
+    view = MessageView(message)
+
+    assert 'id' == view.id
+    assert 'subject' == view.subject
+    assert {'key': 'value'} == view.properties
+
+
+@pytest.mark.parametrize('content_type, body, expected', [
+    ('application/json', b'{"a": 1}', {'a': 1}),
+    ('application/geo+json; charset=utf-8', '{"a": 1}', {'a': 1}),
+    ('text/plain', b'text', 'text'),
+    ('text/plain; charset="latin-1"', b'caf\xe9', 'caf\xe9'),
+    ('application/octet-stream', b'\x00\x01', b'\x00\x01'),
+    (None, {'a': 1}, {'a': 1}),
+])
+def test_message_view__decode(content_type, body, expected):
+    view = MessageView(proton.Message(body=body, content_type=content_type))
+
+    assert expected == view.decode()
+
+
+def test_message_view__decode_is_cached_and_accepts_a_custom_decoder():
+    view = MessageView(proton.Message(body=b'{"a": 1}', content_type='application/json'))
+
+    assert view.decode() is view.decode()
+    assert b'{"a": 1}' == view.decode(bytes)
+    assert view.decode(bytes) is not view.decode(bytes)
+
+
+def test_message_view__from_encoded__is_forwarded_as_is_and_decoded_lazily():
+    encoded = bytearray(proton.Message(id='id', body=b'body').encode())
+
+    view = MessageView(encoded=encoded)
+
+    assert view.encoded.obj is encoded
+    assert view._message is None
+    assert 'id' == view.id
+    assert b'body' == view.payload.tobytes()
+
+
+def test_message_view__encoded__encodes_the_message_once():
+    message = proton.Message(body=json.dumps({'a': 1}))
+    view = MessageView(message)
+
+    assert view.encoded is view.encoded
+    decoded = proton.Message()
+    decoded.decode(view.encoded.tobytes())
+    assert message.body == decoded.body
+
+
+def test_message_view_consumer__invalid_mode__raises_valueerror():
+    with pytest.raises(ValueError):
+        MessageViewConsumer(Mock(), mode='invalid')
+
+
+def test_message_view_consumer__view_mode__consumer_receives_a_message_view():
+    message_consumer = Mock()
+    message = proton.Message(body=b'body')
+
+    MessageViewConsumer(message_consumer, mode=VIEW)(message)
+
+    view = message_consumer.call_args.args[0]
+    assert isinstance(view, MessageView)
+    assert view.message is message
+
+
+def test_message_view_consumer__pass_through_mode__view_of_the_delivery__encoded_bytes_are_forwarded_undecoded():
+    message_consumer = Mock()
+    encoded = proton.Message(body={'a': 1}).encode()
+    view = MessageView(encoded=encoded)
+
+    MessageViewConsumer(message_consumer, mode=PASS_THROUGH)(view)
+
+    forwarded = message_consumer.call_args.args[0]
+    assert isinstance(forwarded, memoryview)
+    assert forwarded.obj is encoded
+    assert view._message is None
+
+
+@pytest.mark.parametrize('body', [b'body', {'a': 1}, ['x'], 'text', 1])
+def test_message_view_consumer__pass_through_mode__proton_message__consumer_receives_the_encoded_message(body):
+    message_consumer = Mock()
+
+    MessageViewConsumer(message_consumer, mode=PASS_THROUGH)(proton.Message(body=body))
+
+    forwarded = message_consumer.call_args.args[0]
+    assert isinstance(forwarded, memoryview)
+    decoded = proton.Message()
+    decoded.decode(forwarded.tobytes())
+    assert body == decoded.body
+
+
+def _delivery_event(encoded, address='queue'):
+    link = Mock(is_receiver=True, state=0)
+    link.source.address = address
+    link.recv = Mock(return_value=encoded)
+    delivery = Mock(link=link, readable=True, partial=False, aborted=False, pending=len(encoded))
+
+    return Mock(delivery=delivery, link=link, message=None)
+
+
+def test_message_view_delivery_handler__view_queue__message_is_passed_on_as_a_view_of_the_delivery():
+    encoded = proton.Message(id='id', body=b'body').encode()
+    event = _delivery_event(encoded)
+    incoming_message_handler = Mock(auto_accept=True)
+    handler = MessageViewDeliveryHandler(incoming_message_handler, is_view_queue=lambda queue: queue == 'queue')
+
+    handler.on_delivery(event)
+
+    event.link.recv.assert_called_once_with(len(encoded))
+    event.link.advance.assert_called_once()
+    incoming_message_handler.on_message.assert_called_once_with(event)
+    incoming_message_handler.on_delivery.assert_not_called()
+    assert isinstance(event.message, MessageView)
+    assert event.message.encoded.obj is encoded
+    assert event.message._message is None
+    event.delivery.update.assert_called_once_with(Delivery.ACCEPTED)
+    event.delivery.settle.assert_called_once()
+
+
+def test_message_view_delivery_handler__consumer_rejects__delivery_is_rejected():
+    event = _delivery_event(proton.Message(body=b'body').encode())
+    incoming_message_handler = Mock(auto_accept=True)
+    incoming_message_handler.on_message.side_effect = Reject()
+    handler = MessageViewDeliveryHandler(incoming_message_handler, is_view_queue=lambda queue: True)
+
+    handler.on_delivery(event)
+
+    event.delivery.update.assert_called_once_with(Delivery.REJECTED)
+    event.delivery.settle.assert_called_once()
+
+
+def test_message_view_delivery_handler__other_queue__delivery_is_left_to_the_replaced_handler():
+    event = _delivery_event(proton.Message(body=b'body').encode(), address='other')
+    incoming_message_handler = Mock(spec=IncomingMessageHandler)
+    handler = MessageViewDeliveryHandler(incoming_message_handler, is_view_queue=lambda queue: queue == 'queue')
+
+    handler.on_delivery(event)
+
+    incoming_message_handler.on_delivery.assert_called_once_with(event)
+    event.link.recv.assert_not_called()
@@ -30,7 +30,7 @@ Details on EUROCONTROL: http://www.eurocontrol.int
 
 __author__ = "EUROCONTROL (SWIM)"
 
-from unittest.mock import Mock
+from unittest.mock import Mock, call
 
 import pytest
 
@@ -44,7 +44,7 @@ def test_swimpublisher__publish_topic_requires_running():
     swim_publisher = SWIMPublisher(container, sm_api_client)
 
     with pytest.raises(RuntimeError) as e:
-        swim_publisher.publish_topic('topic')
+        swim_publisher.publish_topic_messenger(Mock())
     assert "Action cannot complete because container has not been started yet" == str(e.value)
 
 
@@ -101,3 +101,135 @@ def test_swimsubscriber__unsubscribe_requires_running():
     with pytest.raises(RuntimeError) as e:
         swim_subscriber.unsubscribe(Mock())
     assert "Action cannot complete because container has not been started yet" == str(e.value)
+
+
+def _make_running_subscriber(topic_names):
+    container = Mock()
+    container.is_running = Mock(return_value=True)
+    sm_api_client = Mock()
+    sm_api_client.get_topics = Mock(return_value=[_topic(name, i) for i, name in enumerate(topic_names)])
+    sm_api_client.post_subscription = Mock(
+        side_effect=lambda subscription: Mock(topic_id=subscription.topic_id, queue=f'queue-{subscription.topic_id}'))
+
+    return SWIMSubscriber(container, sm_api_client)
+
+
+def _topic(name, topic_id):
+    topic = Mock(id=topic_id)
+    topic.name = name
+
+    return topic
+
+
+def test_swimsubscriber__subscribe__topic_not_found__raises_valueerror():
+    swim_subscriber = _make_running_subscriber(['arrivals.EBBR.a'])
+
+    with pytest.raises(ValueError) as e:
+        swim_subscriber.subscribe(topic_name='arrivals.EBBR.b', message_consumer=Mock())
+    assert "No topic found with name arrivals.EBBR.b" == str(e.value)
+
+
+def test_swimsubscriber__subscribe_pattern__subscribes_matching_topics():
+    swim_subscriber = _make_running_subscriber(['arrivals.EBBR.a', 'arrivals.EBBR.b', 'arrivals.EHAM.a'])
+    message_consumer = Mock()
+
+    pattern_subscription = swim_subscriber.subscribe_pattern('arrivals.EBBR.*', message_consumer)
+
+    assert ['arrivals.EBBR.a', 'arrivals.EBBR.b'] == sorted(pattern_subscription.subscriptions)
+    assert [call(queue='queue-0', message_consumer=message_consumer),
+            call(queue='queue-1', message_consumer=message_consumer)] == \
+        sorted(swim_subscriber.container.consumer.attach_message_consumer.call_args_list,
+               key=lambda c: c.kwargs['queue'])
+
+
+def test_swimsubscriber__new_topics_matching_a_pattern_are_subscribed_incrementally():
+    swim_subscriber = _make_running_subscriber(['arrivals.EBBR.a'])
+    pattern_subscription = swim_subscriber.subscribe_pattern('arrivals.EBBR.#', Mock())
+
+    created = swim_subscriber.on_topic_created(_topic('arrivals.EBBR.b', 1))
+    assert 1 == len(created)
+
+    swim_subscriber.sm_api_client.get_topics.return_value = [
+        _topic('arrivals.EBBR.a', 0), _topic('arrivals.EBBR.b', 1), _topic('arrivals.EBBR.c.d', 2),
+        _topic('departures.EBBR.a', 3)
+    ]
+    created = swim_subscriber.sync_topics()
+    assert 1 == len(created)
+    assert ['arrivals.EBBR.a', 'arrivals.EBBR.b', 'arrivals.EBBR.c.d'] == sorted(pattern_subscription.subscriptions)
+
+    assert [] == swim_subscriber.sync_topics()
+    assert 3 == swim_subscriber.sm_api_client.post_subscription.call_count
+
+
+def test_swimsubscriber__unsubscribe_pattern__unsubscribes_all_and_stops_following():
+    swim_subscriber = _make_running_subscriber(['arrivals.EBBR.a', 'arrivals.EBBR.b'])
+    pattern_subscription = swim_subscriber.subscribe_pattern('arrivals.#', Mock())
+
+    swim_subscriber.unsubscribe_pattern(pattern_subscription)
+
+    assert 2 == swim_subscriber.sm_api_client.delete_subscription_by_id.call_count
+    assert [] == swim_subscriber.on_topic_created(_topic('arrivals.EBBR.c', 2))
+
+
+def test_swimsubscriber__subscribe__does_not_subscribe_active_patterns_to_new_topics():
+    swim_subscriber = _make_running_subscriber(['arrivals.EBBR.a'])
+    swim_subscriber.subscribe_pattern('arrivals.#', Mock())
+    swim_subscriber.sm_api_client.get_topics.return_value = [_topic('arrivals.EBBR.a', 0), _topic('arrivals.EBBR.b', 1)]
+
+    subscription = swim_subscriber.subscribe(topic_name='arrivals.EBBR.b', message_consumer=Mock())
+
+    assert 1 == subscription.topic_id
+    assert 2 == swim_subscriber.sm_api_client.post_subscription.call_count
+
+    # the topic is still picked up by the pattern upon sync
+    assert 1 == len(swim_subscriber.sync_topics())
+
+
+def test_swimsubscriber__sync_topics__drops_pattern_subscriptions_of_removed_topics():
+    swim_subscriber = _make_running_subscriber(['arrivals.EBBR.a', 'arrivals.EBBR.b'])
+    pattern_subscription = swim_subscriber.subscribe_pattern('arrivals.#', Mock())
+    removed = pattern_subscription.subscriptions['arrivals.EBBR.b']
+    swim_subscriber.sm_api_client.get_topics.return_value = [_topic('arrivals.EBBR.a', 0)]
+    swim_subscriber.sm_api_client.delete_subscription_by_id.side_effect = Exception('not found')
+
+    assert [] == swim_subscriber.sync_topics()
+
+    assert ['arrivals.EBBR.a'] == list(pattern_subscription.subscriptions)
+    swim_subscriber.sm_api_client.delete_subscription_by_id.assert_called_once_with(removed.id)
+    swim_subscriber.container.consumer.detach_message_consumer.assert_called_once_with(queue=removed.queue)
+    assert removed.queue not in swim_subscriber.message_consumers
+
+
+def test_swimsubscriber__subscribe_pattern__subscription_fails__created_subscriptions_are_rolled_back():
+    swim_subscriber = _make_running_subscriber(['arrivals.EBBR.a', 'arrivals.EBBR.b'])
+    post_subscription = swim_subscriber.sm_api_client.post_subscription.side_effect
+    created = []
+
+    def post_once(subscription):
+        if created:
+            raise Exception('unavailable')
+        created.append(post_subscription(subscription))
+        return created[0]
+
+    swim_subscriber.sm_api_client.post_subscription.side_effect = post_once
+
+    with pytest.raises(Exception):
+        swim_subscriber.subscribe_pattern('arrivals.#', Mock())
+
+    assert [] == swim_subscriber.pattern_subscriptions
+    assert {} == swim_subscriber.message_consumers
+    swim_subscriber.sm_api_client.delete_subscription_by_id.assert_called_once_with(created[0].id)
+    swim_subscriber.container.consumer.detach_message_consumer.assert_called_once_with(queue=created[0].queue)
+
+
+def test_swimsubscriber__sync_topics__topic_recreated_under_the_same_name__pattern_subscription_is_refreshed():
+    swim_subscriber = _make_running_subscriber(['arrivals.EBBR.a'])
+    pattern_subscription = swim_subscriber.subscribe_pattern('arrivals.#', Mock())
+    old = pattern_subscription.subscriptions['arrivals.EBBR.a']
+    swim_subscriber.sm_api_client.get_topics.return_value = [_topic('arrivals.EBBR.a', 10)]
+
+    created = swim_subscriber.sync_topics()
+
+    assert 1 == len(created)
+    assert 10 == pattern_subscription.subscriptions['arrivals.EBBR.a'].topic_id
+    swim_subscriber.sm_api_client.delete_subscription_by_id.assert_called_once_with(old.id)
@@ -0,0 +1,89 @@
+"""
+Copyright 2020 EUROCONTROL
+==========================================
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+   disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided with the distribution.
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products
+   derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE
+USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+==========================================
+
+Editorial note: this license is an instance of the BSD license template as provided by the Open Source Initiative:
+http://opensource.org/licenses/BSD-3-Clause
+
+Details on EUROCONTROL: http://www.eurocontrol.int
+"""
+
+__author__ = "EUROCONTROL (SWIM)"
+
+import pytest
+
+from pubsub_facades.topic_index import TopicPattern, TopicTrie
+
+TOPIC_NAMES = [
+    'arrivals',
+    'arrivals.EBBR.a',
+    'arrivals.EBBR.b.c',
+    'arrivals.EHAM.a',
+    'departures.EBBR.a',
+]
+
+
+@pytest.fixture
+def trie():
+    trie = TopicTrie()
+    for name in TOPIC_NAMES:
+        trie.insert(name, name)
+
+    return trie
+
+
+def test_topic_pattern__empty__raises_valueerror():
+    with pytest.raises(ValueError):
+        TopicPattern('')
+
+
+@pytest.mark.parametrize('pattern, expected', [
+    ('arrivals', ['arrivals']),
+    ('arrivals.EBBR.*', ['arrivals.EBBR.a']),
+    ('arrivals.EBBR.#', ['arrivals.EBBR.a', 'arrivals.EBBR.b.c']),
+    ('arrivals.#', ['arrivals', 'arrivals.EBBR.a', 'arrivals.EBBR.b.c', 'arrivals.EHAM.a']),
+    ('*.EBBR.a', ['arrivals.EBBR.a', 'departures.EBBR.a']),
+    ('arrivals.EB*.a', ['arrivals.EBBR.a']),
+    ('#.a', ['arrivals.EBBR.a', 'arrivals.EHAM.a', 'departures.EBBR.a']),
+    ('#.#', TOPIC_NAMES),
+    ('unknown.#', []),
+])
+def test_topic_trie__match(trie, pattern, expected):
+    assert sorted(expected) == sorted(trie.match(TopicPattern(pattern)))
+    assert sorted(expected) == sorted(name for name in TOPIC_NAMES if TopicPattern(pattern).matches(name))
+
+
+def test_topic_trie__get_insert_remove(trie):
+    assert 5 == len(trie)
+    assert 'arrivals.EBBR.a' == trie.get('arrivals.EBBR.a')
+    assert trie.get('arrivals.EBBR') is None
+
+    assert 'arrivals.EBBR.b.c' == trie.remove('arrivals.EBBR.b.c')
+    assert trie.remove('arrivals.EBBR.b.c') is None
+    assert 4 == len(trie)
+    assert 'arrivals.EBBR.b.c' not in trie
+    assert [] == trie.match(TopicPattern('arrivals.EBBR.b.#'))
+
+    trie.insert('arrivals.EBBR.a', 'replaced')
+    assert 4 == len(trie)
+    assert 'replaced' == trie.get('arrivals.EBBR.a')